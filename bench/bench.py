@@ -0,0 +1,246 @@
+"""
+Offline benchmark of the scrapers against the local mock career sites.
+
+Every scraper runs its full `main()` (run 1 and run 2 where it has one) in its own
+process, pointed at mock.py, and reports
+
+    pages/sec   successful responses per second of wall time
+    p50 / p99   request latency in milliseconds, as seen by the aiohttp client
+    peak RSS    of the scraper process, in MB
+
+Usage:
+
+    python bench/bench.py                                  # every company
+    python bench/bench.py microsoft meta --jobs 5000 --latency 0.05
+    python bench/bench.py --throttle 0.05 --malformed 0.01 # fault injection
+    python bench/bench.py --save bench/baseline.json
+    python bench/bench.py --compare bench/baseline.json    # exit 1 on regression
+
+The sites' own pacing is replaced by a fixed `--rate` so the numbers measure the
+scrapers rather than the rate limiter; `--rate 0` keeps the adaptive limiter.
+"""
+
+import argparse
+import asyncio
+import functools
+import glob
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRAPE_DIR = os.path.join(BENCH_DIR, os.pardir, "scrape")
+COMPANIES = ["amazon", "google", "netflix", "microsoft", "apple", "meta"]
+RATE = 500  # requests per second per host, 0 keeps the scrapers' own pacing
+TOLERANCE = 0.2  # relative change flagged as a regression by --compare
+
+
+def percentile(values, q: float):
+    """Nearest-rank percentile of a list of numbers, None when it is empty"""
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def trace_config(latencies, statuses):
+    """aiohttp trace hooks recording the latency and status of every request"""
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        latencies.append(time.perf_counter() - ctx.start)
+        statuses[params.response.status] += 1
+
+    async def on_request_exception(session, ctx, params):
+        statuses[type(params.exception).__name__] += 1
+
+    config = aiohttp.TraceConfig(trace_config_ctx_factory=types.SimpleNamespace)
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+
+def point_at_mock(module, company: str, base: str):
+    """Swap the scheme and host of the module's *_URL constants for the mock's"""
+    for name in dir(module):
+        value = getattr(module, name)
+        if name.endswith("_URL") and isinstance(value, str):
+            setattr(module, name, re.sub(r"^https://[^/]+", f"{base}/{company}", value))
+
+
+def count_records(company: str):
+    """Rows of the snapshots the scraper wrote to data/"""
+    import storage
+
+    counts = {}
+    for path in sorted(glob.glob(f"data/{company}-*")):
+        if path.endswith((".csv", ".parquet")):
+            counts[os.path.basename(path)] = len(storage.read_snapshot(path))
+    return counts
+
+
+def count_failures(company: str):
+    failures = 0
+    for path in glob.glob(f"data/{company}-*-failures.jsonl"):
+        with open(path) as file:
+            failures += sum(1 for _ in file)
+    return failures
+
+
+def run_child(company: str, base: str, rate: float, fmt: str):
+    """Run one scraper in this process and print its metrics as a JSON line"""
+    sys.path.insert(0, os.path.abspath(SCRAPE_DIR))
+    import aiohttp
+
+    import engine
+    from ratelimit import RateLimiter
+
+    module = __import__(company)
+    point_at_mock(module, company, base)
+    if rate:
+        engine.RateLimiter = lambda **_: RateLimiter(rate=rate, max_rate=rate)
+    latencies, statuses = [], Counter()
+    aiohttp.ClientSession = functools.partial(
+        aiohttp.ClientSession, trace_configs=[trace_config(latencies, statuses)]
+    )
+
+    start = time.perf_counter()
+    asyncio.run(module.main(fmt=fmt))
+    seconds = time.perf_counter() - start
+    pages = sum(count for status, count in statuses.items() if status == 200)
+    result = {
+        "seconds": round(seconds, 3),
+        "requests": len(latencies),
+        "pages_per_sec": round(pages / seconds, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "records": count_records(company),
+        "failures": count_failures(company),
+    }
+    print(json.dumps(result))
+
+
+async def run_company(company: str, base: str, args):
+    """Run a scraper in a fresh process (and data directory), return its metrics"""
+    with tempfile.TemporaryDirectory() as workdir:
+        command = [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--child",
+            company,
+            "--base",
+            base,
+            "--rate",
+            str(args.rate),
+            "--format",
+            args.format,
+        ]
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=workdir,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+    output = stdout.decode().strip().splitlines()
+    if args.verbose:
+        print("\n".join(output[:-1]))
+    if process.returncode != 0 or not output:
+        print(stderr.decode())
+        raise RuntimeError(f"{company} benchmark failed")
+    return json.loads(output[-1])
+
+
+def report(results):
+    print(
+        f"{'company':<10} {'pages/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7} "
+        f"{'seconds':>8} {'records':>8} {'failed':>7}"
+    )
+    for company, result in results.items():
+        records = sum(result["records"].values())
+        print(
+            f"{company:<10} {result['pages_per_sec']:>8} {result['p50_ms']!s:>8} "
+            f"{result['p99_ms']!s:>8} {result['peak_rss_mb']:>7} "
+            f"{result['seconds']:>8} {records:>8} {result['failures']:>7}"
+        )
+
+
+def regressions(results, baseline, tolerance: float = TOLERANCE):
+    """Metrics that got worse than the baseline by more than `tolerance`"""
+    found = []
+    for company, result in results.items():
+        before = baseline.get(company)
+        if before is None:
+            continue
+        if result["pages_per_sec"] < before["pages_per_sec"] * (1 - tolerance):
+            found.append((company, "pages_per_sec"))
+        for metric in ("p99_ms", "peak_rss_mb"):
+            if result[metric] and before[metric]:
+                if result[metric] > before[metric] * (1 + tolerance):
+                    found.append((company, metric))
+    return found
+
+
+async def main(args):
+    import mock
+
+    companies = args.companies or COMPANIES
+    sites = mock.MockSites(args.jobs, args.latency, args.throttle, args.malformed)
+    runner, base = await mock.serve(sites)
+    results = {}
+    try:
+        # one scraper at a time so they do not compete for the CPU
+        for company in companies:
+            results[company] = await run_company(company, base, args)
+    finally:
+        await runner.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("companies", nargs="*", metavar="company")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throttle", type=float, default=0.0)
+    parser.add_argument("--malformed", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=RATE)
+    parser.add_argument("--format", choices=("csv", "parquet", "blocks"), default="csv")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--base", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.base, args.rate, args.format)
+        sys.exit()
+    unknown = set(args.companies) - set(COMPANIES)
+    if unknown:
+        parser.error(f"unknown companies: {', '.join(sorted(unknown))}")
+    results = asyncio.run(main(args))
+    report(results)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=4)
+    if args.compare:
+        with open(args.compare) as file:
+            found = regressions(results, json.load(file), args.tolerance)
+        for company, metric in found:
+            print(f"Regression: {company} {metric}")
+        sys.exit(1 if found else 0)
@@ -0,0 +1,231 @@
+"""
+Fixture responses of every career site, for the mock server.
+
+Each company has a recorded job record (trimmed to the fields the scrapers and
+normalize.py use) that is replayed with a different id for every job, wrapped in the
+same response envelope as the real API.
+"""
+
+import copy
+from collections import Counter
+
+AMAZON_JOB = {
+    "id": "2353331",
+    "id_icims": "2353331",
+    "title": "Software Development Engineer, Prime Video",
+    "business_category": "amazon-prime-video",
+    "job_category": "Software Development",
+    "job_family": "Software Development",
+    "normalized_country_code": "USA",
+    "normalized_state_name": "Washington",
+    "normalized_city_name": "Seattle",
+    "normalized_location": "Seattle, Washington, USA",
+    "job_function_id": "job_function_corporate_80rdb4",
+    "posted_date": "May 19, 2023",
+    "description": "Prime Video is changing the way millions of customers watch.",
+    "basic_qualifications": "- 3+ years of non-internship professional experience",
+    "preferred_qualifications": "- Bachelor's degree in computer science",
+}
+# facets the mock counts, the ones scrape/amazon.py partitions on first
+AMAZON_FACETS = ("normalized_country_code", "business_category")
+GOOGLE_JOB = {
+    "id": "jobs/112206355385541318",
+    "title": "Software Engineer III, Google Cloud",
+    "company_name": "Google",
+    "categories": ["SOFTWARE_ENGINEERING"],
+    "locations": [{"display": "Sunnyvale, CA, USA", "country_code": "US"}],
+    "publish_date": "2023-05-18T20:38:33.545Z",
+    "description": "<p>Google's software engineers develop the next-generation.</p>",
+    "responsibilities": "<ul><li>Write product or system development code.</li></ul>",
+    "qualifications": "<ul><li>Bachelor's degree or equivalent.</li></ul>",
+}
+NETFLIX_JOB = {
+    "id": "244719",
+    "external_id": "JR21720",
+    "text": "Senior Software Engineer, Studio",
+    "team": "Product",
+    "subteam": "Studio Engineering",
+    "location": "Los Gatos, California",
+    "created_at": "2023-05-12T17:50:31+00:00",
+    "description": "<p>Netflix is one of the world's leading entertainment services.</p>",
+}
+MICROSOFT_CARD = {
+    "jobId": "1556417",
+    "title": "Software Engineer II",
+    "postingDate": "2023-05-19T23:12:18+00:00",
+    "properties": {
+        "locations": ["Redmond, Washington, United States"],
+        "primaryLocation": "Redmond, Washington, United States",
+        "workSiteFlexibility": "Up to 50% work from home",
+        "profession": "Software Engineering",
+        "discipline": "Software Engineering",
+        "jobType": "Experienced Professionals",
+        "roleType": "Individual Contributor",
+        "employmentType": "Full-Time",
+        "educationLevel": "Bachelor's Degree",
+    },
+}
+MICROSOFT_JOB = {
+    "jobId": "1556417",
+    "title": "Software Engineer II",
+    "category": "Software Engineering",
+    "subcategory": "Software Engineering",
+    "roleType": "Individual Contributor",
+    "travelPercentage": "0-25 %",
+    "posted": "2023-05-19T23:12:18+00:00",
+    "unposted": "2123-05-19T23:12:18+00:00",
+    "jobType": "Experienced Professionals",
+    "employmentType": "Full-Time",
+    "description": "<p>Azure Core is looking for a Software Engineer.</p>",
+    "qualifications": "<p>Bachelor's Degree in Computer Science.</p>",
+    "responsibilities": "<p>Design and build distributed services.</p>",
+    "primaryWorkLocation": {"city": "Redmond", "country": "United States"},
+    "workLocations": [{"city": "Redmond", "country": "United States"}],
+    "educationLevel": "Bachelor's Degree",
+    "workSiteFlexibility": "Up to 50% work from home",
+    "jobStatus": "Active",
+    "closedDate": None,
+}
+APPLE_CARD = {
+    "id": "PIPE-200477591",
+    "positionId": "200477591",
+    "postingTitle": "Software Engineer, Maps",
+    "postDateInGMT": "2023-05-18T06:33:55.658Z",
+    "jobSummary": "Apple Maps is looking for a software engineer.",
+    "locations": [{"name": "Cupertino", "countryName": "United States"}],
+    "team": {
+        "teamName": "Software and Services",
+        "teamID": "SFTWR",
+        "teamCode": "SFTWR",
+    },
+}
+APPLE_JOB = {
+    "jobNumber": "200477591",
+    "postingTitle": "Software Engineer, Maps",
+    "minimumQualifications": "Strong Swift or Objective-C skills.",
+    "preferredQualifications": "Experience with map rendering.",
+    "description": "You will build the map rendering pipeline.",
+}
+META_JOB = {
+    "id": "1086384452567485",
+    "title": "Software Engineer, Infrastructure",
+    "locations": ["Menlo Park, CA", "Seattle, WA"],
+    "teams": ["Software Engineering"],
+    "sub_teams": ["Infrastructure"],
+}
+META_PAGE = """<!DOCTYPE html><html><head><title>{title}</title></head><body>
+<div class="_9ata _8ww0">{title}</div>
+<div class="_6hy- _8lfs">Menlo Park, CA</div>
+<div class="_1n-_ _6hy- _94t2">Meta Infrastructure builds the systems behind our apps.</div>
+<div class="_h46 _8lfy _8lfy"><ul><li>Design large scale systems</li>
+<li>Own services end to end</li></ul></div>
+<div class="_h46 _8lfy _8lfy"><ul><li>Bachelor's degree in Computer Science</li></ul></div>
+<div class="_h46 _8lfy _8lfy"><ul><li>Experience with C++ or Python</li></ul></div>
+{filler}</body></html>"""
+# the real job pages carry a lot of markup around the fields that are scraped
+META_FILLER = '<div class="x1"><span class="x2">navigation</span></div>\n' * 500
+
+
+def replay(template: dict, index: int, **ids):
+    """Copy of a recorded job with fresh ids"""
+    job = copy.deepcopy(template)
+    for field, value in ids.items():
+        job[field] = value.format(index=index)
+    return job
+
+
+def amazon_search(jobs, offset: int, limit: int):
+    """A page of the matching jobs, with the facets of all of them like the real API"""
+    facets = {}
+    for facet in AMAZON_FACETS:
+        counts = Counter(job[facet] for job in jobs)
+        facets[f"{facet}_facet"] = [{value: n} for value, n in counts.items()]
+    return {
+        "error": None,
+        "hits": len(jobs),
+        "facets": facets,
+        "content": "",
+        "jobs": jobs[offset : offset + limit],
+    }
+
+
+def amazon_jobs(count: int):
+    countries = ["USA", "IND", "GBR", "DEU", "CAN"]
+    categories = ["amazon-prime-video", "aws", "devices", "retail", "operations"]
+    jobs = []
+    for index in range(count):
+        job = replay(AMAZON_JOB, index, id="{index}", id_icims="{index}")
+        job["normalized_country_code"] = countries[index % len(countries)]
+        # a different cycle length so every country spreads over the categories
+        job["business_category"] = categories[index // 7 % len(categories)]
+        jobs.append(job)
+    return jobs
+
+
+def google_search(page: int, page_size: int, count: int):
+    start = (page - 1) * page_size
+    jobs = [
+        replay(GOOGLE_JOB, index, id="jobs/{index}")
+        for index in range(start, min(start + page_size, count))
+    ]
+    next_page = page + 1 if start + page_size < count else None
+    return {
+        "count": count,
+        "next_page": next_page,
+        "page_size": page_size,
+        "jobs": jobs,
+    }
+
+
+def netflix_search(page: int, page_size: int, count: int):
+    start = (page - 1) * page_size
+    postings = [
+        replay(NETFLIX_JOB, index, id="{index}", external_id="JR{index}")
+        for index in range(start, min(start + page_size, count))
+    ]
+    return {
+        "records": {"postings": postings},
+        "info": {"postings": {"total_result_count": count}},
+    }
+
+
+def microsoft_search(page: int, page_size: int, count: int):
+    start = (page - 1) * page_size
+    jobs = [
+        replay(MICROSOFT_CARD, index, jobId="{index}")
+        for index in range(start, min(start + page_size, count))
+    ]
+    result = {
+        "searchId": "bench",
+        "totalJobs": count,
+        "filters": [{"name": "profession", "values": ["Software Engineering"]}],
+        "jobs": jobs,
+    }
+    return {"operationResult": {"result": result, "status": 0}, "errorInfo": None}
+
+
+def microsoft_job(job_id: str):
+    result = replay(MICROSOFT_JOB, 0, jobId=job_id)
+    return {"operationResult": {"result": result, "status": 0}, "errorInfo": None}
+
+
+def apple_search(page: int, page_size: int, count: int):
+    start = (page - 1) * page_size
+    results = [
+        replay(APPLE_CARD, index, id="PIPE-{index}", positionId="{index}")
+        for index in range(start, min(start + page_size, count))
+    ]
+    return {"searchResults": results, "totalRecords": count}
+
+
+def apple_job(job_id: str):
+    return replay(APPLE_JOB, 0, jobNumber=job_id)
+
+
+def meta_search(count: int):
+    jobs = [replay(META_JOB, index, id="{index}") for index in range(count)]
+    return {"data": {"job_search": jobs}}
+
+
+def meta_page(job_id: str):
+    return META_PAGE.format(title=f"Software Engineer {job_id}", filler=META_FILLER)
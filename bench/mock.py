@@ -0,0 +1,163 @@
+"""
+Local mock of every career site, serving the fixtures in fixtures.py.
+
+Routes mirror the real paths under a company prefix, e.g. /amazon/en/search.json or
+/microsoft/search/api/v1/job/{id}, so a scraper is pointed at the mock by swapping
+the scheme and host of its URL constants. Faults are injected at random (seeded):
+
+- latency: every response waits `latency` seconds (+/- 50% jitter)
+- throttle: share of responses answered 429 with a short Retry-After
+- malformed: share of responses whose body is cut in half
+
+Usage: python bench/mock.py --port 8765 --jobs 1000 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from urllib.parse import parse_qs
+
+from aiohttp import web
+
+import fixtures
+
+JOBS = 1000  # postings per company
+LATENCY = 0.02
+THROTTLE = 0.0
+MALFORMED = 0.0
+SEED = 0
+
+
+def page_number(request, name: str = "page"):
+    return int(request.query.get(name, 1))
+
+
+class MockSites:
+    """aiohttp handlers of every mocked endpoint"""
+
+    def __init__(
+        self,
+        jobs: int = JOBS,
+        latency: float = LATENCY,
+        throttle: float = THROTTLE,
+        malformed: float = MALFORMED,
+        seed: int = SEED,
+    ):
+        self.jobs = jobs
+        self.latency = latency
+        self.throttle = throttle
+        self.malformed = malformed
+        self.random = random.Random(seed)
+        self.amazon = fixtures.amazon_jobs(jobs)
+        self.csrf_token = "bench-token"
+
+    def app(self):
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_get("/amazon/en/search.json", self.amazon_search)
+        app.router.add_get("/google/api/v3/search/", self.google_search)
+        app.router.add_get("/netflix/api/search", self.netflix_search)
+        app.router.add_get("/microsoft/search/api/v1/search", self.microsoft_search)
+        app.router.add_get("/microsoft/search/api/v1/job/{id}", self.microsoft_job)
+        app.router.add_get("/apple/api/csrfToken", self.apple_csrf)
+        app.router.add_post("/apple/api/role/search", self.apple_search)
+        app.router.add_get("/apple/api/role/detail/{id}", self.apple_job)
+        app.router.add_post("/meta/graphql", self.meta_search)
+        app.router.add_get("/meta/jobs/{id}/", self.meta_page)
+        return app
+
+    @web.middleware
+    async def faults(self, request, handler):
+        if self.latency:
+            await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+        if self.random.random() < self.throttle:
+            return web.Response(status=429, headers={"Retry-After": "0.1"})
+        resp = await handler(request)
+        if self.random.random() < self.malformed and resp.body:
+            body = resp.body
+            resp.body = body[: len(body) // 2]
+        return resp
+
+    async def amazon_search(self, request):
+        query = parse_qs(request.query_string)
+        jobs = self.amazon
+        for name, values in query.items():
+            if name.endswith("[]") and name != "facets[]":
+                facet = name[:-2]
+                jobs = [job for job in jobs if str(job.get(facet)) == values[0]]
+        offset = int(request.query.get("offset", 0))
+        limit = int(request.query.get("result_limit", 10))
+        body = fixtures.amazon_search(jobs, offset, limit)
+        return web.json_response(body)
+
+    async def google_search(self, request):
+        body = fixtures.google_search(page_number(request), 20, self.jobs)
+        return web.json_response(body)
+
+    async def netflix_search(self, request):
+        body = fixtures.netflix_search(page_number(request), 20, self.jobs)
+        return web.json_response(body)
+
+    async def microsoft_search(self, request):
+        page_size = int(request.query.get("pgSz", 20))
+        body = fixtures.microsoft_search(
+            page_number(request, "pg"), page_size, self.jobs
+        )
+        return web.json_response(body)
+
+    async def microsoft_job(self, request):
+        return web.json_response(fixtures.microsoft_job(request.match_info["id"]))
+
+    async def apple_csrf(self, request):
+        resp = web.Response(headers={"X-Apple-CSRF-Token": self.csrf_token})
+        resp.set_cookie("jssid", "bench")
+        return resp
+
+    async def apple_search(self, request):
+        if request.headers.get("X-Apple-CSRF-Token") != self.csrf_token:
+            return web.Response(status=403)
+        page = json.loads(await request.text())["page"]
+        return web.json_response(fixtures.apple_search(page, 20, self.jobs))
+
+    async def apple_job(self, request):
+        if request.headers.get("X-Apple-CSRF-Token") != self.csrf_token:
+            return web.Response(status=403)
+        return web.json_response(fixtures.apple_job(request.match_info["id"]))
+
+    async def meta_search(self, request):
+        return web.json_response(fixtures.meta_search(self.jobs))
+
+    async def meta_page(self, request):
+        html = fixtures.meta_page(request.match_info["id"])
+        return web.Response(text=html, content_type="text/html")
+
+
+async def serve(sites: MockSites, port: int = 0):
+    """Start the mock on localhost, return the runner and the base url"""
+    runner = web.AppRunner(sites.app())
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://localhost:{port}"
+
+
+async def main(args):
+    sites = MockSites(args.jobs, args.latency, args.throttle, args.malformed)
+    runner, base = await serve(sites, args.port)
+    print(f"Serving the mock career sites on {base}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--jobs", type=int, default=JOBS)
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    parser.add_argument("--throttle", type=float, default=THROTTLE)
+    parser.add_argument("--malformed", type=float, default=MALFORMED)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,136 @@
+"""
+Facet count tables of a snapshot.
+
+The dashboards count postings per facet (`value_counts` of city, business_category,
+...) and per pair of facets (AWS postings by city). Those counts are computed once
+per company and day at ingest (`python scrape/normalize.py`), over the categorical
+codes of every facet column, and saved as a small table
+
+    data/{company}-{date}-facets.csv
+
+with one row per facet value (`by` empty) or pair of values:
+
+    facet, value, by, by_value, count
+
+so the notebook reads a few kilobytes instead of scanning the postings:
+
+    facets = Facets.read("data/amazon-2023-05-21-facets.csv")
+    facets.counts("city", business_category="aws")
+"""
+
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+FACETS = "data/{company}-{date}-facets.csv"
+COLUMNS = ["facet", "value", "by", "by_value", "count"]
+
+
+def facets_path(company: str, day: str):
+    return FACETS.format(company=company, date=day)
+
+
+class Facets:
+    """Single and pairwise facet counts of a snapshot"""
+
+    def __init__(self, table):
+        self.table = table
+        self.facets = sorted(set(table["facet"]))
+
+    @classmethod
+    def build(cls, df, columns=None):
+        """Count every facet column of a snapshot, alone and by every other one"""
+        if columns is None:
+            columns = sorted(storage.CATEGORY_COLUMNS.intersection(df.columns))
+        codes = {col: pd.factorize(df[col].astype("string")) for col in columns}
+        tables = []
+        for col in columns:
+            col_codes, values = codes[col]
+            counts = np.bincount(col_codes[col_codes >= 0], minlength=len(values))
+            tables.append(table(col, np.asarray(values), "", "", counts))
+        for col, by in itertools.combinations(columns, 2):
+            col_codes, values = codes[col]
+            by_codes, by_values = codes[by]
+            valid = (col_codes >= 0) & (by_codes >= 0)
+            keys = col_codes[valid] * len(by_values) + by_codes[valid]
+            keys, counts = np.unique(keys, return_counts=True)
+            tables.append(
+                table(
+                    col,
+                    np.asarray(values)[keys // len(by_values)],
+                    by,
+                    np.asarray(by_values)[keys % len(by_values)],
+                    counts,
+                )
+            )
+        if not tables:
+            return cls(pd.DataFrame(columns=COLUMNS))
+        return cls(pd.concat(tables, ignore_index=True))
+
+    @classmethod
+    def read(cls, path: str):
+        table = pd.read_csv(
+            path,
+            dtype={"facet": str, "value": str, "by": str, "by_value": str},
+            keep_default_na=False,
+        )
+        return cls(table)
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.table.to_csv(path, index=False)
+        return path
+
+    def counts(self, facet: str, **where):
+        """Postings per value of a facet, like `df[facet].value_counts()`
+
+        One other facet can be fixed, e.g. counts("city", business_category="aws").
+        """
+        if facet not in self.facets:
+            raise KeyError(f"{facet} is not a facet of the snapshot: {self.facets}")
+        if len(where) > 1:
+            raise ValueError("Only pairs of facets are precomputed")
+        if not where:
+            rows = self.table[(self.table["facet"] == facet) & (self.table["by"] == "")]
+            series = rows.set_index("value")["count"]
+        else:
+            ((by, value),) = where.items()
+            pairs = self.pairs(facet, by)
+            pairs = pairs[pairs.index.get_level_values(by) == str(value)]
+            series = pairs.droplevel(by)
+        series = series.sort_values(ascending=False, kind="stable")
+        return series.rename_axis(facet)
+
+    def pairs(self, facet: str, by: str):
+        """Postings per pair of values of two facets, indexed by (facet, by)"""
+        table = self.table
+        rows = table[(table["facet"] == facet) & (table["by"] == by)]
+        if rows.empty:
+            # the pair is stored once, in the order of the columns
+            rows = table[(table["facet"] == by) & (table["by"] == facet)]
+            rows = rows.rename(columns={"value": "by_value", "by_value": "value"})
+        series = rows.set_index(["value", "by_value"])["count"]
+        return series.rename_axis([facet, by])
+
+
+def table(facet: str, values, by: str, by_values, counts):
+    return pd.DataFrame(
+        {
+            "facet": facet,
+            "value": values,
+            "by": by,
+            "by_value": by_values,
+            "count": counts,
+        }
+    )
+
+
+def write_facets(company: str, day: str, df):
+    """Compute and save the facet tables of a company's snapshot"""
+    path = Facets.build(df).save(facets_path(company, day))
+    print(f"Saved the {company} facet counts to {path}")
+    return path
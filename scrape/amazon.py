@@ -9,92 +9,169 @@ import json
 import math
 import os
 from datetime import date
+from urllib.parse import quote
 
-import aiohttp
-import pandas as pd
-import requests
-
+import storage
+from engine import Crawler, parse_args
+from fastjson import Schema
+from sink import Sink
 
 COMPANY = "amazon"
 PAGE_SIZE = 100
 MAX_RECORD = 10000  # Amazon API won't serve the job postings after 10,000th records
+# facets used to split a search with more than MAX_RECORD hits, in order
+PARTITION_FACETS = [
+    "normalized_country_code",
+    "business_category",
+    "job_function_id",
+    "normalized_state_name",
+    "normalized_city_name",
+]
+# only the fields that are used are decoded, the facets only when planning
+PLAN_PAGE = Schema({"hits": int, "facets": dict, "jobs": list}, "AmazonPlanPage")
+JOBS_PAGE = Schema({"jobs": list}, "AmazonJobsPage")
 AMAZON_URL = "https://www.amazon.jobs/en/search.json?radius=24km&facets%5B%5D=normalized_country_code&facets%5B%5D=normalized_state_name&facets%5B%5D=normalized_city_name&facets%5B%5D=location&facets%5B%5D=business_category&facets%5B%5D=category&facets%5B%5D=schedule_type_id&facets%5B%5D=employee_class&facets%5B%5D=normalized_location&facets%5B%5D=job_function_id&facets%5B%5D=is_manager&facets%5B%5D=is_intern&offset={offset}&result_limit={result_limit}&sort=relevant&latitude=&longitude=&loc_group_id=&loc_query=&base_query=&city=&country=&region=&county=&query_options=&"
 
 
-def scrape_single(page: int):
-    """Scrape a single page of microsoft career website"""
+def search_url(page: int, filters=()):
+    """Build the search url of a page, narrowed down by (facet, value) filters"""
     url = AMAZON_URL.format(offset=page * PAGE_SIZE, result_limit=PAGE_SIZE)
-    with requests.get(url) as resp:
-        resp_json = resp.json()
-        return resp_json
+    for facet, value in filters:
+        url += f"{quote(facet)}%5B%5D={quote(str(value))}&"
+    return url
 
 
-async def scrape_single_async(session, page: int):
-    """Scrape a single page of microsoft career website"""
-    url = AMAZON_URL.format(offset=page * PAGE_SIZE, result_limit=PAGE_SIZE)
-    async with session.get(url) as resp:
-        resp_json = await resp.json()
-        return resp_json
-
-
-async def scrape_multiple_async(start_page: int, end_page: int):
-    tasks = []
-    async with aiohttp.ClientSession() as session:
-        for page in range(start_page, end_page + 1):
-            task = scrape_single_async(session, page)
-            tasks.append(task)
-        result = await asyncio.gather(*tasks)
-    result = [item for sublist in result for item in sublist["jobs"]]
-    return result
-
-
-def get_total_records():
-    """Get the total number of jobs"""
-    key_dict = scrape_single(1)
-    total = key_dict["hits"]
-    print(f"Total jobs: {total}")
-    return total
-
-
-def get_filter():
-    """Get all available filters"""
-    key_dict = scrape_single(1)
-    return key_dict["facets"]
-
-
-# def get_all_page():
-#     """Scrape all page and append to a dataframe"""
-#     total_page = get_total_page()
-#     jobs = []
-#     for page in range(1, 3):
-#         res_json = scrape_single(page)
-#         jobs.extend(res_json["jobs"])
-#     return jobs
-
-
-async def get_all_pages_async():
-    """Scrape all page and append to a dataframe"""
-    total_record = get_total_records()
-    total_page = math.ceil(total_record / PAGE_SIZE)
-    # amazon do not allow retrieval of > 10,000 records
-    if total_record < 10000:
-        result = await scrape_multiple_async(1, total_page)
-    else:
-        # if there are > 10,000 records, scrape multiple time
-        num_page = math.ceil(10000 / PAGE_SIZE) - 1
-        result = await scrape_multiple_async(0, num_page)
-    return result
+def page_request(key):
+    """Build the request for a single page of amazon career website
 
+    `key` is a (filters, page) pair, see `search_url`
+    """
+    filters, page = key
+    return {"method": "GET", "url": search_url(page, filters)}
 
-if __name__ == "__main__":
-    os.makedirs("data", exist_ok=True)
 
-    # save various filters
-    with open(f"data/{COMPANY}-filter-{date.today()}.json", "w") as file:
-        json.dump(get_filter(), file, indent=4, sort_keys=True)
+def extract_jobs(resp_json):
+    return resp_json["jobs"]
+
 
-    # save the jobs description
-    result = asyncio.run(get_all_pages_async())
-    pd.DataFrame(result).to_csv(
-        f"data/{COMPANY}-{date.today()}.csv", index=False, encoding="utf-8-sig"
+def save_filters(filters):
+    """Save the available filters next to the snapshots"""
+    with open(f"data/{COMPANY}-filter-{date.today()}.json", "w") as file:
+        json.dump(filters, file, indent=4, sort_keys=True)
+
+
+def facet_counts(facets, facet: str):
+    """Get the (value, count) pairs of a facet from a search response"""
+    entries = facets.get(f"{facet}_facet", facets.get(facet)) or []
+    counts = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            counts.extend(entry.items())
+        else:
+            value, count = entry
+            counts.append((value, count))
+    return [(value, int(count)) for value, count in counts if int(count) > 0]
+
+
+async def plan_partitions(crawler, filters=(), first_page=None, first_pages=None):
+    """Split the search into disjoint queries with at most MAX_RECORD hits each
+
+    A query over the cap is split on the values of the next facet in
+    PARTITION_FACETS, recursively, until every part can be paged through in full.
+    Returns a list of (filters, hits) pairs. The first pages fetched while planning
+    are kept in `first_pages` (filters -> response) so they are not fetched again.
+    """
+    if first_page is None:
+        first_page = await crawler.fetch(page_request((filters, 0)), PLAN_PAGE)
+    if first_pages is not None:
+        first_pages[filters] = first_page
+    hits = first_page["hits"]
+    if hits <= MAX_RECORD:
+        return [(filters, hits)]
+
+    used = {facet for facet, _ in filters}
+    for facet in (facet for facet in PARTITION_FACETS if facet not in used):
+        counts = facet_counts(first_page["facets"], facet)
+        if counts:
+            break
+    else:
+        print(f"Cannot split {filters} any further, only {MAX_RECORD}/{hits} jobs")
+        return [(filters, hits)]
+    if sum(count for _, count in counts) < hits:
+        missing = hits - sum(count for _, count in counts)
+        print(f"{missing} jobs of {filters} have no {facet} and may be missed")
+
+    # values under the cap do not need their first page fetched to be planned
+    parts = [(filters + ((facet, value),), count) for value, count in counts]
+    small = [part for part in parts if part[1] <= MAX_RECORD]
+    large = [part for part in parts if part[1] > MAX_RECORD]
+    pages = await crawler.map(
+        [(part_filters, 0) for part_filters, _ in large],
+        page_request,
+        lambda r: r,
+        body=PLAN_PAGE,
     )
+    planned = []
+    for (part_filters, count), page in zip(large, pages):
+        if page is None:
+            # recorded in the failure report, the rest of the plan goes on
+            print(f"Cannot plan {part_filters}, its {count} jobs are missed")
+        else:
+            planned.append(plan_partitions(crawler, part_filters, page, first_pages))
+    plans = await asyncio.gather(*planned)
+    return small + [part for plan in plans for part in plan]
+
+
+async def get_all_pages_async(path: str):
+    """Scrape all page and stream the jobs to a csv
+
+    Amazon only serves the first MAX_RECORD hits of a search, so the search is
+    partitioned on facets first and every partition is paged through concurrently.
+    The unfiltered first page is fetched once, for the filters, the plan and its
+    own jobs.
+    """
+    async with Crawler(COMPANY) as crawler:
+        first_page = await crawler.fetch_first(((), 0), page_request, PLAN_PAGE)
+        save_filters(first_page["facets"])
+        first_pages = {}
+        partitions = await plan_partitions(crawler, (), first_page, first_pages)
+        keys = [
+            (filters, page)
+            for filters, hits in partitions
+            for page in range(math.ceil(min(hits, MAX_RECORD) / PAGE_SIZE))
+            if not (page == 0 and filters in first_pages)
+        ]
+        print(f"Total jobs: {sum(hits for _, hits in partitions)}")
+        print(f"{len(partitions)} partitions, {len(keys)} pages")
+        # a job can show up in more than one partition (e.g. multiple locations)
+        seen = set()
+
+        async def put(jobs):
+            jobs = [job for job in jobs if job["id"] not in seen]
+            seen.update(job["id"] for job in jobs)
+            await sink.put(jobs)
+
+        async with Sink(path) as sink:
+            # first pages of the partitions, already fetched while planning
+            for filters, _ in partitions:
+                if filters in first_pages:
+                    await put(extract_jobs(first_pages[filters]))
+            async for jobs in crawler.stream(
+                keys, page_request, extract_jobs, body=JOBS_PAGE, default=[]
+            ):
+                await put(jobs)
+
+
+async def main(runs=(1,), fmt: str = "csv", resume=False, incremental=False):
+    """Scrape the job postings, Amazon only has run 1"""
+    if 1 not in runs:
+        return
+    os.makedirs("data", exist_ok=True)
+
+    # save various filters and the jobs description
+    await get_all_pages_async(storage.snapshot_path(COMPANY, fmt=fmt))
+
+
+if __name__ == "__main__":
+    args = parse_args(runs=False)
+    asyncio.run(main(fmt=args.format))
@@ -3,46 +3,65 @@ Website: https://jobs.apple.com/en-us/search?sort=relevance
 URL: https://jobs.apple.com/api/role/search
 Response body fields: ['searchResults', 'totalRecords']
   - 'searchResults' is the list of jobs
+
+Every request needs the CSRF token (and cookies) handed out by /api/csrfToken. The
+token is fetched once per crawl, shared by all workers and refreshed when the API
+rejects it.
 """
 
 import asyncio
 import json
 import math
 import os
-import time
-from datetime import date
 
-import aiohttp
-import pandas as pd
-import requests
+import checkpoint
+import storage
+from engine import Crawler, parse_args
+from sink import Sink
 
 COMPANY = "apple"
 PAGE_SIZE = 20
 APPLE_URL = "https://jobs.apple.com/api/role/search"
-BATCH_SIZE_1 = 15
+BATCH_SIZE = 200
+RATE = 1  # starting requests per second, adjusted on 429
+HEADERS = {"Accept": "*/*", "Content-Type": "application/json"}
 APPLE_CSRF_URL = "https://jobs.apple.com/api/csrfToken"
 APPLE_JOB_DETAIL_URL = (
     "https://jobs.apple.com/api/role/detail/{job_id}?languageCd=en-us"
 )
 
 
-def get_headers():
-    with requests.get(APPLE_CSRF_URL) as resp:
-        headers = {
-            "cookie": "; ".join(
-                [cookie.name + "=" + cookie.value for cookie in resp.cookies]
-            ),
-            "X-Apple-CSRF-Token": resp.headers["X-Apple-CSRF-Token"],
-            "host": "jobs.apple.com",
-            "Accept": "*/*",
-            "Content-Type": "application/json",
-        }
-    return headers
+class CsrfToken:
+    """CSRF token shared by every request of a crawl, see `engine.Crawler`"""
+
+    status = (401, 403)  # responses of a request sent with an expired token
+
+    def __init__(self):
+        self.token = None
+        self.lock = asyncio.Lock()
+
+    async def fetch(self, session):
+        # the cookies that go with the token are kept in the session's cookie jar
+        async with session.get(APPLE_CSRF_URL) as resp:
+            resp.raise_for_status()
+            self.token = resp.headers["X-Apple-CSRF-Token"]
+        print("Fetched a CSRF token")
+
+    async def headers(self, session):
+        async with self.lock:
+            if self.token is None:
+                await self.fetch(session)
+        return {"X-Apple-CSRF-Token": self.token}
+
+    async def refresh(self, session, headers):
+        async with self.lock:
+            # the other workers rejected with the same token wait for this refresh
+            if self.token == headers.get("X-Apple-CSRF-Token"):
+                await self.fetch(session)
 
 
-def scrape_single(page: int, headers):
-    """Scrape a single page of apple career website"""
-    url = APPLE_URL
+def page_request(page: int):
+    """Build the request for a single page of apple career website"""
     data = json.dumps(
         {
             "query": "",
@@ -52,141 +71,67 @@ def scrape_single(page: int, headers):
             "sort": "relevance",
         }
     )
-    with requests.post(url, data=data, headers=headers) as resp:
-        try:
-            resp_json = resp.json()
-            return resp_json
-        except requests.exceptions.JSONDecodeError:
-            print(f"Failed to scrape page {page}")
-            return {}
-
-
-async def scrape_single_async(session, page: int, headers):
-    """Scrape a single page of apple career website"""
-    url = APPLE_URL
-    data = json.dumps(
-        {
-            "query": "",
-            "filters": {"range": {"standardWeeklyHours": {"start": None, "end": None}}},
-            "page": page,
-            "locale": "en-us",
-            "sort": "relevance" "page",
-        }
-    )
-    async with session.post(url, data=data, headers=headers) as resp:
-        try:
-            resp_json = await resp.json()
-            return resp_json
-        except aiohttp.client_exceptions.ContentTypeError:
-            print(f"Failed to scrape page {page}")
-            return {}
+    return {"method": "POST", "url": APPLE_URL, "data": data}
 
 
-async def scrape_multiple_async(pages, headers):
-    """Scrape more job details of multiple jobs using job ids"""
-    conn = aiohttp.TCPConnector(limit=20)
-    tasks = []
-    async with aiohttp.ClientSession(connector=conn) as session:
-        for page in pages:
-            task = scrape_single_async(session, page, headers)
-            tasks.append(task)
-        jobs = await asyncio.gather(*tasks)
-        return jobs
-
-
-def get_total_records():
-    headers = get_headers()
-    resp = scrape_single(1, headers)
-    total = resp["totalRecords"]
-    print(f"Total jobs: {total}")
-    return total
-
-
-def get_all_pages():
-    """Scrape all page and append to a dataframe"""
-    total_record = get_total_records()
-    total_page = math.ceil(total_record / PAGE_SIZE)
-    headers = get_headers()
-    jobs = []
-    for page in range(1, total_page + 1):
-        res_json = scrape_single(page, headers)
-        if "searchResults" in res_json:
-            jobs.extend(res_json["searchResults"])
-    return jobs
-
-
-async def get_all_pages_async():
-    """Scrape all page and append to a dataframe"""
-    total_record = get_total_records()
-    total_page = math.ceil(total_record / PAGE_SIZE)
-    headers = get_headers()
-
-    ls_df = []
-    batches = [range(i, i + BATCH_SIZE_1) for i in range(0, total_page, BATCH_SIZE_1)]
-    for idx, batch in enumerate(batches):
-        if idx != 0:
-            sleep_duration = 60  # 5 * random.randrange(4, 7)
-            print(f"Sleep for {sleep_duration} seconds")
-            time.sleep(sleep_duration)
-        print(idx)
-        print("Input length:", len(batch))
-        jobs = await scrape_multiple_async(batch, headers)
-
-        jobs = [job["searchResults"] for job in jobs if job != {}]
-        print("Output length:", len(jobs))
-        df_job = pd.DataFrame(jobs)
-        ls_df.append(df_job)
-    return pd.concat(ls_df)
-
-    # tasks = []
-    # async with aiohttp.ClientSession() as session:
-    #     for page in range(1, total_page + 1):
-    #         task = scrape_single_async(session, page, headers)
-    #         tasks.append(task)
-    #     jobs = await asyncio.gather(*tasks)
-    # result = [job["searchResults"] for job in jobs if job != {}]
-    # result = [job for single_page in result for job in single_page]
-    # return result
-
-
-async def scrape_single_by_id(session, job_id):
-    """Scrape more job details using job id"""
+def job_request(job_id):
+    """Build the request for the details of a single job"""
     url = APPLE_JOB_DETAIL_URL.format(job_id=job_id)
-    async with session.get(url) as resp:
-        try:
-            resp_json = await resp.json()
-            return resp_json
-        except aiohttp.client_exceptions.ContentTypeError:
-            print(f"Failed to scrape {job_id}")
-            return {}
+    return {"method": "GET", "url": url}
+
+
+def extract_jobs(resp_json):
+    return resp_json.get("searchResults", [])
+
 
+async def get_all_pages_async(path: str):
+    """Scrape all page and stream the jobs to a csv
 
-async def scrape_multiple_by_id(job_ids):
+    Page 1 is fetched once, for the total and its own jobs.
+    """
+    crawler = Crawler(COMPANY, headers=HEADERS, rate=RATE, auth=CsrfToken())
+    async with crawler, Sink(path) as sink:
+        first_page = await crawler.fetch_first(1, page_request)
+        total_record = first_page["totalRecords"]
+        print(f"Total jobs: {total_record}")
+        await sink.put(extract_jobs(first_page))
+        pages = range(2, math.ceil(total_record / PAGE_SIZE) + 1)
+        async for jobs in crawler.stream(pages, page_request, extract_jobs):
+            await sink.put(jobs)
+
+
+async def scrape_multiple_by_id(crawler, job_ids):
     """Scrape more job details of multiple jobs using job ids"""
-    conn = aiohttp.TCPConnector(limit=20)
-    tasks = []
-    async with aiohttp.ClientSession(connector=conn) as session:
-        for job_id in job_ids:
-            task = scrape_single_by_id(session, job_id)
-            tasks.append(task)
-        jobs = await asyncio.gather(*tasks)
-        return jobs
+    jobs = await crawler.map(job_ids, job_request, lambda job: job, default={})
+    return [{"id": job_id, **job} for job_id, job in zip(job_ids, jobs) if job]
 
 
-if __name__ == "__main__":
+async def main(runs=(1, 2), fmt: str = "csv", resume=False, incremental=False):
+    """Scrape the job cards (run 1) and then every job by id (run 2)"""
     os.makedirs("data", exist_ok=True)
+    run1_path = storage.snapshot_path(COMPANY, "-run1", fmt)
+    run2_path = storage.snapshot_path(COMPANY, "-run2", fmt)
 
     # run 1: scrape the job cards
-    df = asyncio.run(get_all_pages_async())
-    # df = pd.DataFrame(get_all_pages())
-    df.to_csv(
-        f"data/{COMPANY}-{date.today()}-run1.csv", index=False, encoding="utf-8-sig"
-    )
+    if 1 in runs and not (resume and os.path.exists(run1_path)):
+        await get_all_pages_async(run1_path)
+
+    if 2 in runs:
+        # run 2: scrape each job by job ID
+        await checkpoint.scrape_details(
+            COMPANY,
+            run1_path,
+            run2_path,
+            Crawler(COMPANY, headers=HEADERS, rate=RATE, auth=CsrfToken()),
+            scrape_multiple_by_id,
+            "id",
+            "postDateInGMT",
+            BATCH_SIZE,
+            resume,
+            incremental,
+        )
+
 
-    # # run 2: scrape each job by job ID
-    # job_ids = df["id"]
-    # # df_job = pd.DataFrame(asyncio.run(scrape_multiple_by_id(job_ids)))
-    # df_job = pd.DataFrame(asyncio.run(scrape_multiple_by_id(job_ids)))
-    # df_job.to_csv(
-    #     f"data/{COMPANY}-{date.today()}-run2.csv", index=False, encoding="utf-8-sig"
-    # )
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(main(args.runs, args.format, args.resume, args.delta))
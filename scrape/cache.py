@@ -0,0 +1,157 @@
+"""
+Opt-in on-disk HTTP response cache for the crawler.
+
+Responses are stored in a SQLite file keyed by method, URL and body. A fresh entry
+(younger than the TTL) is served without touching the network; a stale one is
+revalidated with If-None-Match / If-Modified-Since when the server sent an ETag or
+Last-Modified, and a 304 refreshes it. The file is bounded in size, the least
+recently used entries are evicted first.
+
+    python scrape/run.py --cache            # or python scrape/microsoft.py --cache
+
+Meant for development and re-runs: notebook iteration and repeated runs over the
+same pages become mostly cache hits.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE = "data/http-cache.sqlite"
+TTL = 6 * 60 * 60  # seconds before an entry has to be revalidated
+MAX_SIZE = 500 * 1024 * 1024  # bytes of response bodies kept
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT,
+    body BLOB,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL,
+    accessed_at REAL,
+    size INTEGER
+)
+"""
+
+
+def request_key(request: dict):
+    """Hash of the method, URL and body of a request"""
+    body = request.get("data") or request.get("json") or ""
+    if not isinstance(body, (str, bytes)):
+        body = json.dumps(body, sort_keys=True)
+    if isinstance(body, str):
+        body = body.encode()
+    digest = hashlib.sha256()
+    digest.update(request.get("method", "GET").upper().encode())
+    digest.update(b" " + str(request["url"]).encode() + b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of response bodies with TTL and revalidation"""
+
+    def __init__(self, path: str = CACHE, ttl: float = TTL, max_size: int = MAX_SIZE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.db = sqlite3.connect(path)
+        self.db.execute(SCHEMA)
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)"
+        )
+        (self.size,) = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+
+    def get(self, key: str):
+        """Get the cached (body, etag, last_modified, fresh) of a key, or None"""
+        row = self.db.execute(
+            "SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, stored_at = row
+        if isinstance(body, str):
+            body = body.encode()
+        fresh = time.time() - stored_at < self.ttl
+        if fresh:
+            self.touch(key, refresh=False)
+        return body, etag, last_modified, fresh
+
+    def conditional_headers(self, etag, last_modified):
+        """Headers asking the server to answer 304 if the entry is still valid"""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def touch(self, key: str, refresh: bool = True):
+        """Mark an entry as used, `refresh` restarts its TTL (after a 304)"""
+        now = time.time()
+        if refresh:
+            self.db.execute(
+                "UPDATE responses SET accessed_at = ?, stored_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+        else:
+            self.db.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        self.db.commit()
+
+    def put(self, key: str, url: str, body: bytes, headers):
+        """Store a response body with its validators"""
+        now = time.time()
+        size = len(body)
+        old = self.db.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                url,
+                body,
+                headers.get("ETag"),
+                headers.get("Last-Modified"),
+                now,
+                now,
+                size,
+            ),
+        )
+        self.size += size - (old[0] if old else 0)
+        if self.size > self.max_size:
+            self.evict()
+        self.db.commit()
+
+    def delete(self, key: str):
+        """Drop an entry, e.g. one whose body no longer decodes"""
+        row = self.db.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.size -= row[0]
+            self.db.commit()
+
+    def evict(self):
+        """Drop the least recently used entries until the cache fits in max_size"""
+        rows = self.db.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if self.size <= self.max_size:
+                break
+            evicted.append((key,))
+            self.size -= size
+        self.db.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,157 @@
+"""
+Checkpoints for long detail-fetch runs (run 2).
+
+Every finished batch is appended to a JSON lines file as soon as it is scraped. When a
+run crashes, starting it again with `--resume` reads the checkpoint back and only
+fetches the job ids that are still missing. The final CSV is written from the
+checkpoint a chunk at a time.
+
+`scrape_details` is the whole run 2 of a company, which only passes its crawler, how
+to fetch a batch of job ids and the name of the id column:
+
+    await checkpoint.scrape_details(
+        COMPANY, run1_path, run2_path, Crawler(COMPANY), scrape_multiple_by_id, "id"
+    )
+"""
+
+import asyncio
+import json
+import os
+from datetime import date
+
+import delta
+import storage
+from sink import writer_for
+
+CHECKPOINT = "data/{company}-{date}-run2.checkpoint.jsonl"
+CHUNK_SIZE = 1000  # records per write when converting the checkpoint
+BATCH_SIZE = 200  # job ids fetched between two checkpoint writes
+
+
+def checkpoint_path(company: str):
+    return CHECKPOINT.format(company=company, date=date.today())
+
+
+def read_records(path: str):
+    """Yield the records saved in the checkpoint"""
+    if not os.path.exists(path):
+        return
+    with open(path) as file:
+        for line in file:
+            # the last line may be cut short if the run was killed mid-write
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def load_done_ids(path: str, id_column: str):
+    """Get the ids of the records already saved in the checkpoint"""
+    return {str(record[id_column]) for record in read_records(path)}
+
+
+def append_records(path: str, records):
+    """Persist a finished batch to the checkpoint"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as file:
+        if file.tell() and not _ends_with_newline(path):
+            file.write("\n")
+        for record in records:
+            file.write(json.dumps(record, default=str) + "\n")
+
+
+def _ends_with_newline(path: str):
+    with open(path, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+
+def write_snapshot(path: str, snapshot_path: str, chunksize: int = CHUNK_SIZE):
+    """Convert the checkpoint to the final snapshot, return the number of records"""
+    writer = writer_for(snapshot_path)
+    chunk = []
+    for record in read_records(path):
+        chunk.append(record)
+        if len(chunk) == chunksize:
+            writer.write(chunk)
+            chunk = []
+    writer.write(chunk)
+    writer.close()
+    return writer.count
+
+
+def remaining_ids(job_ids, path: str, id_column: str):
+    """Drop the job ids whose details are already in the checkpoint"""
+    done = load_done_ids(path, id_column)
+    print(f"Resuming from checkpoint, {len(done)} jobs already scraped")
+    return [job_id for job_id in job_ids if str(job_id) not in done]
+
+
+def clear(path: str):
+    """Remove the checkpoint once the final output has been written"""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def batch_scrape_by_id(
+    company: str,
+    crawler,
+    fetch,
+    job_ids,
+    id_column: str,
+    batch_size: int = BATCH_SIZE,
+    resume=False,
+    carried=None,
+):
+    """Scrape job details batch by batch, saving every batch to the checkpoint
+
+    `crawler` is the (not yet entered) async context manager of the crawler and
+    `fetch(crawler, job_ids)` returns the records of a batch, empty for failed jobs.
+    With `resume`, the job ids already in today's checkpoint are skipped.
+    `carried` records (unchanged jobs from a delta run) are saved up front.
+    """
+    path = checkpoint_path(company)
+    # file work runs in a thread, other companies may share the event loop (run.py)
+    if resume:
+        job_ids = await asyncio.to_thread(remaining_ids, job_ids, path, id_column)
+    else:
+        await asyncio.to_thread(clear, path)
+        await asyncio.to_thread(append_records, path, carried or [])
+    batches = [job_ids[i : i + batch_size] for i in range(0, len(job_ids), batch_size)]
+    async with crawler as session:
+        for idx, batch in enumerate(batches):
+            jobs = [job for job in await fetch(session, batch) if job]
+            print(f"Batch {idx + 1}/{len(batches)}: {len(jobs)}/{len(batch)} jobs")
+            await asyncio.to_thread(append_records, path, jobs)
+
+
+async def scrape_details(
+    company: str,
+    run1_path: str,
+    run2_path: str,
+    crawler,
+    fetch,
+    id_column: str,
+    stamp_column: str = None,
+    batch_size: int = BATCH_SIZE,
+    resume=False,
+    incremental=False,
+):
+    """Run 2: fetch the details of every job of run 1 into the run 2 snapshot
+
+    With `incremental`, only the jobs new or changed since the previous snapshot are
+    fetched, see `delta.plan` for `stamp_column`.
+    """
+    df = await asyncio.to_thread(storage.read_snapshot, run1_path, [id_column])
+    job_ids, carried = df[id_column].astype(str).tolist(), []
+    if incremental:
+        job_ids, carried = await asyncio.to_thread(
+            delta.plan, company, run1_path, id_column, stamp_column
+        )
+    await batch_scrape_by_id(
+        company, crawler, fetch, job_ids, id_column, batch_size, resume, carried
+    )
+    path = checkpoint_path(company)
+    total = await asyncio.to_thread(write_snapshot, path, run2_path)
+    print(f"Final number of jobs: {total}")
+    await asyncio.to_thread(clear, path)
@@ -0,0 +1,160 @@
+"""
+Near-duplicate postings.
+
+The same role is often posted many times with only the location changed, within a
+company and across companies, which skews the term counts. Every posting gets a
+MinHash signature of the word shingles of its description and qualifications;
+locality-sensitive hashing buckets the signatures band by band, and the candidates
+sharing a bucket whose signatures agree on at least THRESHOLD of the hashes are
+joined into clusters. No pair of postings is compared outside a bucket, so it runs
+in roughly linear time:
+
+    jobs = tag_duplicates(load_jobs(dates=partition_dates()[-1:]))
+    jobs.drop_duplicates("cluster")  # one posting per role
+
+Usage: python scrape/dedup.py [--date 2023-05-21] [company ...]
+writes the cluster of every normalized job to data/clusters-{date}.csv
+"""
+
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import normalize
+import text
+
+CLUSTERS = "data/clusters-{date}.csv"
+TEXT_COLUMNS = ["description", "qualifications"]
+SHINGLE = 5  # words per shingle
+NUM_PERM = 128  # hashes per signature
+BANDS = 32  # LSH bands of NUM_PERM // BANDS hashes
+THRESHOLD = 0.8  # estimated Jaccard similarity of near-duplicates
+SEED = 0
+
+
+def _parameters(seed: int = SEED):
+    """Odd multipliers and offsets of the hash functions, the same in every process"""
+    rng = np.random.default_rng(seed)
+    words = rng.integers(1, 2**63, SHINGLE, dtype="uint64") | 1
+    a = rng.integers(1, 2**63, NUM_PERM, dtype="uint64") | 1
+    b = rng.integers(0, 2**63, NUM_PERM, dtype="uint64")
+    return words, a, b
+
+
+def signatures(texts, seed: int = SEED):
+    """MinHash signatures (one row of NUM_PERM uint32 per text) of a batch
+
+    Texts without a single word get a row of zeros, `has_words` tells them apart.
+    """
+    words, a, b = _parameters(seed)
+    codes, vocab = text.encode(texts)
+    hashes = pd.util.hash_array(vocab)[codes]
+    is_end = np.append((vocab == text.END)[codes], [True] * SHINGLE)
+    docs = np.cumsum(is_end[: len(codes)])
+
+    # shingle starting at every word, cut short at the end of its document
+    starts = np.flatnonzero(~is_end[: len(codes)])
+    shingles = np.zeros(len(starts), dtype="uint64")
+    alive = np.ones(len(starts), dtype=bool)
+    padded = np.append(hashes, np.zeros(SHINGLE, dtype="uint64"))
+    with np.errstate(over="ignore"):
+        for offset in range(SHINGLE):
+            alive &= ~is_end[starts + offset]
+            shingles += np.where(alive, padded[starts + offset] * words[offset], 0)
+
+    counts = np.bincount(docs[starts], minlength=len(texts))
+    has_words = counts > 0
+    first = np.cumsum(counts) - counts
+    sig = np.zeros((len(texts), NUM_PERM), dtype="uint32")
+    if not len(shingles):
+        return sig, has_words
+    with np.errstate(over="ignore"):
+        for perm in range(NUM_PERM):
+            values = ((shingles * a[perm] + b[perm]) >> np.uint64(32)).astype("uint32")
+            sig[has_words, perm] = np.minimum.reduceat(values, first[has_words])
+    return sig, has_words
+
+
+def candidates(sig, has_words):
+    """Pairs of postings sharing a bucket in any band, as (posting, first in bucket)"""
+    rows = NUM_PERM // BANDS
+    index = np.flatnonzero(has_words)
+    if not len(index):
+        return index, index
+    pairs = []
+    for band in range(BANDS):
+        keys = pd.util.hash_pandas_object(
+            pd.DataFrame(sig[index, band * rows : (band + 1) * rows]), index=False
+        )
+        buckets, _ = pd.factorize(keys.to_numpy())
+        first = np.full(buckets.max() + 1, len(index))
+        np.minimum.at(first, buckets, np.arange(len(index)))
+        others = np.flatnonzero(first[buckets] != np.arange(len(index)))
+        pairs.append(np.stack([index[others], index[first[buckets[others]]]]))
+    pairs = np.unique(np.concatenate(pairs, axis=1), axis=1)
+    return pairs[0], pairs[1]
+
+
+def components(count: int, left, right):
+    """Connected components of the pairs, labelled by their smallest member"""
+    labels = np.arange(count)
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        merged = labels.copy()
+        np.minimum.at(merged, left, low)
+        np.minimum.at(merged, right, low)
+        merged = merged[merged]
+        if (merged == labels).all():
+            return labels
+        labels = merged
+
+
+def clusters(texts, threshold: float = THRESHOLD, processes=text.PROCESSES):
+    """Cluster of every text, near-duplicates share a cluster (numbered 0, 1, ...)"""
+    texts = pd.Series(texts).fillna("").tolist()
+    batches = [
+        texts[i : i + text.BATCH_SIZE] for i in range(0, len(texts), text.BATCH_SIZE)
+    ]
+    results = text.map_batches(signatures, batches, processes)
+    if not results:
+        return np.array([], dtype="int64")
+    sig = np.concatenate([batch_sig for batch_sig, _ in results])
+    has_words = np.concatenate([batch_has for _, batch_has in results])
+
+    left, right = candidates(sig, has_words)
+    similar = (sig[left] == sig[right]).mean(axis=1) >= threshold
+    labels = components(len(texts), left[similar], right[similar])
+    return pd.factorize(labels)[0]
+
+
+def tag_duplicates(df, columns=TEXT_COLUMNS, threshold: float = THRESHOLD):
+    """Copy of the postings with the `cluster` of near-duplicates and its size"""
+    texts = df[columns[0]].fillna("").astype(str)
+    for col in columns[1:]:
+        texts = texts + "\n" + df[col].fillna("").astype(str)
+    df = df.copy()
+    df["cluster"] = clusters(texts, threshold)
+    df["cluster_size"] = df.groupby("cluster")["cluster"].transform("size")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("companies", nargs="*", metavar="company")
+    parser.add_argument("--date", default=str(date.today()))
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+    jobs = normalize.load_jobs(
+        columns=["id", "company", *TEXT_COLUMNS],
+        companies=args.companies or None,
+        dates=[args.date],
+    )
+    jobs = tag_duplicates(jobs, threshold=args.threshold)
+    path = CLUSTERS.format(date=args.date)
+    jobs[["company", "id", "cluster", "cluster_size"]].to_csv(path, index=False)
+    print(
+        f"{len(jobs)} jobs in {jobs['cluster'].nunique()} clusters, "
+        f"{(jobs['cluster_size'] > 1).sum()} near-duplicates, saved to {path}"
+    )
@@ -0,0 +1,95 @@
+"""
+Incremental (delta) scraping of job details.
+
+Run 1 (the job cards) is cheap, run 2 fetches one detail page per job. In delta mode
+today's run 1 is compared with the most recent earlier run 1 in data/: only new job
+ids, or ids whose card changed, are fetched again, and the details of unchanged jobs
+are carried forward from the previous run 2. Snapshots are only compared with
+earlier snapshots of the same format.
+"""
+
+import glob
+import os
+import re
+from datetime import date
+
+import pandas as pd
+
+import storage
+
+SNAPSHOT = "data/{company}-{date}-{run}.{fmt}"
+
+
+def previous_snapshot(company: str, run: str, fmt: str = "csv"):
+    """Get the date of the latest snapshot before today, or None"""
+    extension = re.escape(fmt)
+    pattern = re.compile(rf"{company}-(\d{{4}}-\d{{2}}-\d{{2}})-{run}\.{extension}$")
+    dates = []
+    snapshots = SNAPSHOT.format(company=company, date="*", run=run, fmt=fmt)
+    for path in glob.glob(snapshots):
+        match = pattern.search(os.path.basename(path))
+        if match and match.group(1) < str(date.today()):
+            dates.append(match.group(1))
+    return max(dates) if dates else None
+
+
+def read_snapshot(path: str):
+    # read every column as text so today's and older files compare the same way
+    if path.endswith(".parquet"):
+        return storage.read_snapshot(path).astype("string").fillna("")
+    return pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+
+def read_records(path: str):
+    """Read a snapshot whose records are carried forward, missing values stay missing"""
+    if path.endswith(".parquet"):
+        return storage.read_snapshot(path)
+    # a CSV has no missing values to keep, they are written back as empty cells
+    return read_snapshot(path)
+
+
+def fingerprint(df, id_column: str, columns):
+    """Map each job id to a hash of its card, or of its timestamp column"""
+    hashes = pd.util.hash_pandas_object(df[columns], index=False)
+    return pd.Series(hashes.values, index=df[id_column])
+
+
+def plan(company: str, run1_path: str, id_column: str, stamp_column: str = None):
+    """Split today's job ids into the ones to fetch and the records to carry forward
+
+    `id_column` must name the job id in both run 1 and run 2. When the cards have
+    a posted/updated timestamp, pass it as `stamp_column`; otherwise the whole card
+    is compared.
+    """
+    fmt = storage.EXTENSIONS[storage.snapshot_format(run1_path)]
+    today = read_snapshot(run1_path)
+    job_ids = today[id_column].tolist()
+    previous = previous_snapshot(company, "run2", fmt)
+    previous_run1 = SNAPSHOT.format(company=company, date=previous, run="run1", fmt=fmt)
+    if previous is None or not os.path.exists(previous_run1):
+        print("No previous snapshot, fetching every job")
+        return job_ids, []
+
+    before = read_snapshot(previous_run1)
+    if stamp_column is not None and stamp_column in before and stamp_column in today:
+        columns = [stamp_column]
+    else:
+        columns = [col for col in today.columns if col in before.columns]
+    old = fingerprint(before.drop_duplicates(id_column), id_column, columns)
+    new = fingerprint(today.drop_duplicates(id_column), id_column, columns)
+    unchanged = set(new.index[new.eq(old.reindex(new.index))])
+
+    previous_run2 = SNAPSHOT.format(company=company, date=previous, run="run2", fmt=fmt)
+    details = read_records(previous_run2)
+    if id_column not in details:
+        print(f"Previous run 2 has no {id_column} column, fetching every job")
+        return job_ids, []
+    ids = details[id_column].astype(str)
+    details = details[ids.isin(unchanged)].drop_duplicates(id_column)
+    carried = set(ids[details.index])
+    fetch_ids = [job_id for job_id in job_ids if job_id not in carried]
+    print(
+        f"Delta against {previous}: {len(fetch_ids)} jobs to fetch, "
+        f"{len(carried)} carried forward"
+    )
+    return fetch_ids, details.to_dict("records")
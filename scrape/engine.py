@@ -0,0 +1,351 @@
+"""
+Shared async crawl engine used by every company scraper.
+
+A Crawler owns one pooled aiohttp session for a host, bounds the number of
+in-flight requests with a semaphore and paces them with an adaptive rate limiter.
+Company modules only describe how to build the request for a key (page number,
+job id) and how to extract records from the body.
+
+    async with Crawler(COMPANY, concurrency=20, rate=5) as crawler:
+        pages = await crawler.map(range(1, 10), page_request, extract_jobs, default=[])
+
+Failed keys are retried with backoff; the ones that still fail are listed in
+data/{company}-{date}-failures.jsonl when the crawler closes.
+
+Hosts that need a session token pass an `auth` object with two coroutines:
+`headers(session)` returns the headers to add to each request and
+`refresh(session, headers)` renews the token those headers carried. Responses with
+a status in `auth.status` refresh the token once for all workers and the request is
+sent again.
+
+Responses can be cached on disk for re-runs, see cache.py and `use_cache`. Request
+latencies, status codes, retries and time spent throttled or parsing are summarised
+in data/{company}-{date}-metrics.jsonl, see metrics.py.
+
+CPU heavy extractors (HTML parsing) can run in an executor instead of on the event
+loop, so parsing overlaps with the requests still in flight:
+
+    with ProcessPoolExecutor() as pool:
+        async with Crawler(COMPANY, executor=pool) as crawler:
+            ...
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from datetime import date
+
+import aiohttp
+
+import cache
+import fastjson
+import storage
+from metrics import RunMetrics
+from ratelimit import RATE, RateLimiter, parse_retry_after
+from retry import MAX_ATTEMPTS, RetryBudget, backoff
+
+CONCURRENCY = 20
+THROTTLE_STATUS = (429, 403)
+MAX_THROTTLED = 5  # give up on a request after being throttled this many times
+# transient failures worth sending the request again for
+RETRY_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+# the response arrived but did not have the expected shape
+EXTRACT_ERRORS = (KeyError, IndexError, AttributeError, TypeError)
+FAILURE_REPORT = "data/{company}-{date}-failures.jsonl"
+response_cache = None  # shared by every crawler once `use_cache` is called
+
+
+def use_cache(path: str = cache.CACHE, ttl: float = cache.TTL):
+    """Cache the responses of the crawlers opened from now on (opt-in)"""
+    global response_cache
+    response_cache = cache.ResponseCache(path, ttl)
+
+
+def parse_args(parser=None, runs: bool = True):
+    """Parse the command line options shared by the scrapers, `--cache` applied
+
+    `runs` adds the options of the companies with a run 2 (job details by id).
+    """
+    parser = parser or argparse.ArgumentParser()
+    if runs:
+        parser.add_argument(
+            "--runs", type=int, nargs="+", choices=(1, 2), default=(1, 2)
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="reuse today's run 1 and only fetch the jobs missing from the "
+            "checkpoint",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="only fetch jobs that are new or changed since the previous snapshot",
+        )
+    parser.add_argument("--format", choices=storage.FORMATS, default="csv")
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="serve repeated requests from the on-disk response cache",
+    )
+    args = parser.parse_args()
+    if args.cache:
+        use_cache()
+    return args
+
+
+def decode(raw: bytes, body, encoding: str = "utf-8"):
+    """Decode a response body as "text", "json" or a `fastjson.Schema`"""
+    if body == "text":
+        return raw.decode(encoding, errors="replace")
+    if body == "json":
+        return fastjson.loads(raw)
+    return body.decode(raw)
+
+
+def is_retriable(error):
+    """Client errors (404, 410, ...) will not succeed when sent again"""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return (
+            error.status < 400 or error.status >= 500 or error.status in THROTTLE_STATUS
+        )
+    return True
+
+
+def timed(extract, data):
+    """Run an extractor, return its result and the seconds it took
+
+    Timed where it runs, in the executor's worker, so a parse does not count the
+    time it waited for one.
+    """
+    start = time.perf_counter()
+    result = extract(data)
+    return result, time.perf_counter() - start
+
+
+class Crawler:
+    """Pooled session with bounded concurrency for a single host"""
+
+    def __init__(
+        self,
+        company: str = None,
+        concurrency: int = CONCURRENCY,
+        headers=None,
+        rate: float = RATE,
+        executor=None,
+        auth=None,
+    ):
+        self.company = company
+        self.concurrency = concurrency
+        self.headers = headers
+        self.executor = executor
+        self.auth = auth
+        self.session = None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = RateLimiter(rate=rate)
+        self.budget = RetryBudget()
+        self.failures = []
+        self.cache = response_cache
+        self.metrics = RunMetrics(company)
+
+    async def __aenter__(self):
+        conn = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.concurrency
+        )
+        self.session = aiohttp.ClientSession(connector=conn, headers=self.headers)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.metrics.write()
+        if self.failures:
+            self.write_failures()
+
+    def write_failures(self):
+        """Append the keys that still failed after retrying to the run's report"""
+        print(f"Failed to scrape {len(self.failures)} keys")
+        if self.company is None:
+            return
+        path = FAILURE_REPORT.format(company=self.company, date=date.today())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as file:
+            for failure in self.failures:
+                file.write(json.dumps(failure, default=str) + "\n")
+        print(f"Failure report: {path}")
+
+    async def fetch(self, request: dict, body: str = "json"):
+        """Send a request and return the decoded body, see `decode`
+
+        Throttled responses slow the host down and the request is sent again, as do
+        responses rejecting an expired token once it is refreshed.
+        """
+        key = entry = None
+        if self.cache is not None:
+            key = cache.request_key(request)
+            entry = self.cache.get(key)
+            if entry is not None and entry[3]:
+                try:
+                    data = decode(entry[0], body)
+                except (ValueError, TypeError):
+                    # stored before bodies were checked, fetch it again
+                    self.cache.delete(key)
+                    entry = None
+                else:
+                    self.metrics.cache["hit"] += 1
+                    return data
+            if entry is not None:
+                headers = dict(request.get("headers") or {})
+                headers.update(self.cache.conditional_headers(entry[1], entry[2]))
+                request = {**request, "headers": headers}
+        for _ in range(MAX_THROTTLED):
+            with self.metrics.timer("rate_limited"):
+                await self.limiter.acquire()
+            with self.metrics.timer("queued"):
+                await self.semaphore.acquire()
+            try:
+                self.budget.record_request()
+                sent = await self.authorize(request)
+                start = time.perf_counter()
+                async with self.session.request(**sent) as resp:
+                    raw = await resp.read()
+                    encoding = resp.get_encoding() if body == "text" else "utf-8"
+                latency = time.perf_counter() - start
+                self.metrics.response(latency, resp.status, len(raw))
+            except RETRY_ERRORS as error:
+                self.metrics.status[type(error).__name__] += 1
+                raise
+            finally:
+                self.semaphore.release()
+            if self.auth is not None and resp.status in self.auth.status:
+                self.metrics.retries["auth"] += 1
+                await self.auth.refresh(self.session, sent["headers"])
+                continue
+            if resp.status in THROTTLE_STATUS:
+                self.metrics.retries["throttled"] += 1
+                retry_after = resp.headers.get("Retry-After")
+                self.limiter.on_throttle(parse_retry_after(retry_after))
+                continue
+            self.limiter.on_success()
+            if resp.status >= 500:
+                resp.raise_for_status()
+            if self.cache is not None and resp.status == 304 and entry is not None:
+                try:
+                    data = decode(entry[0], body)
+                except (ValueError, TypeError) as error:
+                    self.cache.delete(key)
+                    raise ValueError(f"Cached body does not decode: {error}")
+                self.cache.touch(key)
+                self.metrics.cache["revalidated"] += 1
+                return data
+            # only a body that decodes is cached, a truncated one is fetched again
+            data = decode(raw, body, encoding)
+            if self.cache is not None:
+                if resp.status == 200:
+                    self.cache.put(key, request["url"], raw, resp.headers)
+                self.metrics.cache["miss"] += 1
+            return data
+        # still throttled, let the caller see the last response
+        resp.raise_for_status()
+
+    async def authorize(self, request: dict):
+        """Add the auth headers to a request"""
+        if self.auth is None:
+            return request
+        headers = dict(request.get("headers") or {})
+        headers.update(await self.auth.headers(self.session))
+        return {**request, "headers": headers}
+
+    async def run(self, key, build_request, extract, body="json", default=None):
+        """Fetch and extract a single key, retrying transient failures
+
+        A key that still fails is recorded in `self.failures` and replaced by
+        `default`, so one bad response never cancels the whole run.
+        """
+        request = build_request(key)
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return await self.extract(extract, await self.fetch(request, body=body))
+            except RETRY_ERRORS as error:
+                last_attempt = attempt + 1 == MAX_ATTEMPTS
+                if last_attempt or not is_retriable(error) or not self.budget.spend():
+                    self.record_failure(key, request, error, attempt + 1)
+                    return default
+                self.metrics.retries["error"] += 1
+                with self.metrics.timer("backoff"):
+                    await asyncio.sleep(backoff(attempt))
+            except EXTRACT_ERRORS as error:
+                self.record_failure(key, request, error, attempt + 1)
+                return default
+
+    async def extract(self, extract, data):
+        """Run the extractor, in the executor when the crawler has one"""
+        if self.executor is None:
+            result, seconds = timed(extract, data)
+            self.metrics.parsed(seconds)
+            return result
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        result, seconds = await loop.run_in_executor(
+            self.executor, timed, extract, data
+        )
+        # the rest is waiting for a free worker and sending the page over
+        self.metrics.parsed(seconds, queued=time.perf_counter() - start - seconds)
+        return result
+
+    async def fetch_first(self, key, build_request, body="json"):
+        """Fetch the page carrying the totals and filters, retried like any key
+
+        The rest of the crawl depends on it, so it raises instead of returning a
+        default when it cannot be fetched.
+        """
+        resp = await self.run(key, build_request, lambda resp: resp, body)
+        if resp is None:
+            raise RuntimeError(f"Cannot fetch {build_request(key)['url']}")
+        return resp
+
+    async def map(self, keys, build_request, extract, body="json", default=None):
+        """Fetch every key and return the extracted results in key order"""
+        return await asyncio.gather(
+            *(self.run(key, build_request, extract, body, default) for key in keys)
+        )
+
+    async def stream(self, keys, build_request, extract, body="json", default=None):
+        """Fetch every key and yield the extracted results as they complete
+
+        At most `concurrency` keys are in flight and no new key is started while
+        the consumer is busy, so memory stays bounded however many keys there are.
+        """
+        keys = iter(keys)
+        pending = set()
+        try:
+            while True:
+                for key in itertools.islice(keys, self.concurrency - len(pending)):
+                    pending.add(
+                        asyncio.ensure_future(
+                            self.run(key, build_request, extract, body, default)
+                        )
+                    )
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def record_failure(self, key, request, error, attempts):
+        self.metrics.failures += 1
+        self.failures.append(
+            {
+                "key": key,
+                "url": request["url"],
+                "error": f"{type(error).__name__}: {error}",
+                "attempts": attempts,
+            }
+        )
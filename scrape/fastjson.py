@@ -0,0 +1,80 @@
+"""
+Fast JSON decoding of the responses.
+
+`loads` uses orjson or msgspec when one is installed (`poetry install -E fast`) and
+the stdlib json otherwise. A `Schema` lists the fields of a response that are kept;
+with msgspec the other fields (Amazon's facets on every listing page, Microsoft's
+envelope) are skipped while parsing instead of being turned into Python objects:
+
+    JOBS_PAGE = Schema({"operationResult": {"result": {"jobs": list}}})
+    pages = await crawler.map(pages, page_request, extract_jobs, body=JOBS_PAGE)
+
+Decoded schemas are plain dicts and lists, so extractors work the same with or
+without msgspec. Without it a schema decodes the whole body with `loads`.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def loads(raw):
+    """Decode a JSON body (bytes or str) with the fastest decoder available"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    if msgspec is not None:
+        try:
+            return msgspec.json.decode(raw)
+        except msgspec.DecodeError as error:
+            raise ValueError(str(error)) from error
+    return json.loads(raw)
+
+
+class Schema:
+    """Fields of a JSON response worth decoding
+
+    `fields` maps each kept field to its type (`list`, `dict`, `int`, ...) or to
+    the fields kept of a nested object. Every field is required: a response
+    missing one raises TypeError, like a KeyError in an extractor it is not retried.
+    """
+
+    def __init__(self, fields: dict, name: str = "Response"):
+        self.fields = fields
+        self.decoder = None
+        if msgspec is not None:
+            self.decoder = msgspec.json.Decoder(_struct(name, fields))
+
+    def decode(self, raw):
+        if self.decoder is None:
+            return loads(raw)
+        try:
+            return _asdict(self.decoder.decode(raw))
+        except msgspec.ValidationError as error:
+            raise TypeError(str(error)) from error
+        except msgspec.DecodeError as error:
+            raise ValueError(str(error)) from error
+
+
+def _struct(name: str, fields: dict):
+    """msgspec Struct type decoding only `fields`, nested objects become Structs"""
+    annotations = []
+    for field, value in fields.items():
+        if isinstance(value, dict):
+            value = _struct(name + field[:1].upper() + field[1:], value)
+        annotations.append((field, value))
+    return msgspec.defstruct(name, annotations)
+
+
+def _asdict(value):
+    if isinstance(value, msgspec.Struct):
+        return {
+            field: _asdict(getattr(value, field)) for field in value.__struct_fields__
+        }
+    return value
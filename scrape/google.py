@@ -7,60 +7,63 @@ Response body fields: ['count', 'next_page', 'page_size', 'jobs']
 import asyncio
 import math
 import os
-from datetime import date
 
-import aiohttp
-import pandas as pd
-import requests
+import storage
+from engine import Crawler, parse_args
+from sink import Sink
 
 COMPANY = "google"
 PAGE_SIZE = 20
 GOOGLE_URL = "https://careers.google.com/api/v3/search/?distance=50&hl=en_US&jlo=en_US&page={page}&q="
 
 
-def scrape_single(page: int):
-    """Scrape a single page of microsoft career website"""
+def page_request(page: int):
+    """Build the request for a single page of google career website"""
     url = GOOGLE_URL.format(page=page)
-    with requests.get(url) as resp:
-        resp_json = resp.json()
-        return resp_json
+    return {"method": "GET", "url": url}
 
 
-async def scrape_single_async(session, page: int):
-    """Scrape a single page of microsoft career website"""
-    url = GOOGLE_URL.format(page=page)
-    async with session.get(url) as resp:
-        resp_json = await resp.json()
-        return resp_json
+def extract_jobs(resp_json):
+    return resp_json["jobs"]
 
 
-def get_total_records():
-    """Get the total number of jobs"""
-    key_dict = scrape_single(1)
-    total = key_dict["count"]
-    print(f"Total jobs: {total}")
-    return total
+async def iter_pages(crawler):
+    """Yield the jobs of every page as they arrive
 
+    Page 1 gives the total, the other pages are then fetched concurrently. Without
+    a total, the `next_page` cursor of each response is followed instead.
+    """
+    resp_json = await crawler.fetch_first(1, page_request)
+    yield extract_jobs(resp_json)
+    total = resp_json.get("count")
+    if total is not None:
+        print(f"Total jobs: {total}")
+        pages = range(2, math.ceil(total / PAGE_SIZE) + 1)
+        async for jobs in crawler.stream(pages, page_request, extract_jobs):
+            yield jobs
+        return
+    while resp_json.get("next_page"):
+        resp_json = await crawler.fetch_first(resp_json["next_page"], page_request)
+        yield extract_jobs(resp_json)
 
-async def get_all_pages_async():
-    """Scrape all page and append to a dataframe"""
-    total_record = get_total_records()
-    total_page = math.ceil(total_record / PAGE_SIZE)
-    tasks = []
-    async with aiohttp.ClientSession() as session:
-        for page in range(1, total_page + 1):
-            task = scrape_single_async(session, page)
-            tasks.append(task)
-        result = await asyncio.gather(*tasks)
-    result = [item for sublist in result for item in sublist["jobs"]]
-    return result
 
+async def get_all_pages_async(path: str):
+    """Scrape all page and stream the jobs to a csv"""
+    async with Crawler(COMPANY) as crawler, Sink(path) as sink:
+        async for jobs in iter_pages(crawler):
+            await sink.put(jobs)
 
-if __name__ == "__main__":
+
+async def main(runs=(1,), fmt: str = "csv", resume=False, incremental=False):
+    """Scrape the job postings, Google only has run 1"""
+    if 1 not in runs:
+        return
     os.makedirs("data", exist_ok=True)
 
     # save the jobs description
-    result = asyncio.run(get_all_pages_async())
-    pd.DataFrame(result).to_csv(
-        f"data/{COMPANY}-{date.today()}.csv", index=False, encoding="utf-8-sig"
-    )
+    await get_all_pages_async(storage.snapshot_path(COMPANY, fmt=fmt))
+
+
+if __name__ == "__main__":
+    args = parse_args(runs=False)
+    asyncio.run(main(fmt=args.format))
@@ -0,0 +1,204 @@
+"""
+Posting history across the daily snapshots.
+
+Each day's normalized jobs of a company are merged into one SQLite table keyed by
+(company, id), keeping when a posting was first and last seen, when its content
+last changed (hash of its normalized fields) and the first day it was missing:
+
+    company, id, title, category, first_seen, last_seen, changed_at, removed_at,
+    content_hash
+
+The merge is an upsert of the day's postings plus an update of the postings still
+open, so it costs as much as the snapshot, not the history. Every merge also
+records how many postings were added, relisted, changed and removed, so trend and
+churn questions are one query instead of loading every dated CSV:
+
+    history = History()
+    history.added(since="2023-05-15")
+    history.lifetimes(company="amazon")["days_open"].describe()
+    history.churn()
+
+The history is updated by `python scrape/normalize.py`; merge the days in order
+to backfill it.
+"""
+
+import os
+import sqlite3
+
+import pandas as pd
+
+HISTORY = "data/history.sqlite"
+# normalized fields whose change counts as an updated posting
+HASHED_COLUMNS = [
+    "title",
+    "locations",
+    "team",
+    "category",
+    "posted_date",
+    "description",
+    "qualifications",
+]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings (
+    company TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    category TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    changed_at TEXT NOT NULL,
+    removed_at TEXT,
+    content_hash INTEGER NOT NULL,
+    PRIMARY KEY (company, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_first_seen ON postings (first_seen);
+-- entries end with the primary key, so it also finds the open postings of a
+-- company (removed_at IS NULL AND company = ?) when merging
+CREATE INDEX IF NOT EXISTS postings_removed_at ON postings (removed_at);
+CREATE TABLE IF NOT EXISTS snapshots (
+    company TEXT NOT NULL,
+    date TEXT NOT NULL,
+    postings INTEGER,
+    added INTEGER,
+    relisted INTEGER,
+    changed INTEGER,
+    removed INTEGER,
+    PRIMARY KEY (company, date)
+);
+"""
+UPSERT = """
+INSERT INTO postings
+SELECT :company, id, title, category, :day, :day, :day, NULL, content_hash
+FROM today WHERE true
+ON CONFLICT (company, id) DO UPDATE SET
+    title = excluded.title,
+    category = excluded.category,
+    last_seen = excluded.last_seen,
+    changed_at = CASE
+        WHEN content_hash != excluded.content_hash THEN excluded.changed_at
+        ELSE changed_at
+    END,
+    removed_at = NULL,
+    content_hash = excluded.content_hash
+"""
+
+
+def content_hash(jobs):
+    """64-bit hash of the normalized fields of every posting"""
+    # locations are lists, hash the text of every field
+    fields = jobs[HASHED_COLUMNS].astype(str)
+    hashes = pd.util.hash_pandas_object(fields, index=False)
+    return hashes.to_numpy().view("int64")
+
+
+class History:
+    """SQLite store of the lifecycle of every posting"""
+
+    def __init__(self, path: str = HISTORY):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def merge(self, company: str, day: str, jobs):
+        """Merge a day's normalized jobs of a company, return the day's counts"""
+        day = str(day)
+        (latest,) = self.db.execute(
+            "SELECT MAX(date) FROM snapshots WHERE company = ?", (company,)
+        ).fetchone()
+        if latest is not None and day <= latest:
+            print(f"The {company} history already has {latest}, skipping {day}")
+            return None
+        jobs = jobs.drop_duplicates("id")
+        rows = zip(
+            jobs["id"].astype(str),
+            jobs["title"].astype(object).where(jobs["title"].notna(), None),
+            jobs["category"].astype(object).where(jobs["category"].notna(), None),
+            content_hash(jobs).tolist(),
+        )
+        with self.db:
+            self.db.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS today "
+                "(id TEXT PRIMARY KEY, title TEXT, category TEXT, content_hash INTEGER)"
+            )
+            self.db.execute("DELETE FROM today")
+            self.db.executemany("INSERT INTO today VALUES (?, ?, ?, ?)", rows)
+            added, relisted, changed = self.db.execute(
+                """
+                SELECT
+                    COALESCE(SUM(postings.id IS NULL), 0),
+                    COALESCE(SUM(postings.removed_at IS NOT NULL), 0),
+                    COALESCE(SUM(postings.content_hash != today.content_hash), 0)
+                FROM today LEFT JOIN postings
+                    ON postings.company = ? AND postings.id = today.id
+                """,
+                (company,),
+            ).fetchone()
+            self.db.execute(UPSERT, {"company": company, "day": day})
+            removed = self.db.execute(
+                "UPDATE postings SET removed_at = ? "
+                "WHERE company = ? AND removed_at IS NULL AND last_seen < ?",
+                (day, company, day),
+            ).rowcount
+            counts = {
+                "postings": len(jobs),
+                "added": added,
+                "relisted": relisted,
+                "changed": changed,
+                "removed": removed,
+            }
+            self.db.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (company, day, *counts.values()),
+            )
+        print(
+            f"History of {company} on {day}: {added} added, {relisted} relisted, "
+            f"{changed} changed, {removed} removed"
+        )
+        return counts
+
+    def query(self, sql: str, params=()):
+        return pd.read_sql_query(sql, self.db, params=params)
+
+    def added(self, since: str, until: str = None, company: str = None):
+        """Postings first seen in [since, until]"""
+        sql = "SELECT * FROM postings WHERE first_seen >= ? AND first_seen <= ?"
+        params = [str(since), str(until or "9999")]
+        if company is not None:
+            sql += " AND company = ?"
+            params.append(company)
+        return self.query(sql, params)
+
+    def removed(self, since: str, until: str = None, company: str = None):
+        """Postings that disappeared in [since, until]"""
+        sql = "SELECT * FROM postings WHERE removed_at >= ? AND removed_at <= ?"
+        params = [str(since), str(until or "9999")]
+        if company is not None:
+            sql += " AND company = ?"
+            params.append(company)
+        return self.query(sql, params)
+
+    def lifetimes(self, company: str = None):
+        """Days every posting stayed open, up to its last sighting when still open"""
+        sql = """
+            SELECT company, id, title, category, first_seen, removed_at,
+                julianday(COALESCE(removed_at, last_seen)) - julianday(first_seen)
+                    AS days_open
+            FROM postings
+        """
+        params = []
+        if company is not None:
+            sql += " WHERE company = ?"
+            params.append(company)
+        return self.query(sql, params)
+
+    def churn(self, company: str = None):
+        """Postings, added, relisted, changed and removed per company and day"""
+        sql = "SELECT * FROM snapshots"
+        params = []
+        if company is not None:
+            sql += " WHERE company = ?"
+            params.append(company)
+        return self.query(sql + " ORDER BY date, company", params)
+
+    def close(self):
+        self.db.close()
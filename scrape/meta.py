@@ -1,27 +1,42 @@
 """
 Website: https://www.metacareers.com/jobs
-URL: 
+URL:
 """
 
 import asyncio
+import contextlib
 import os
-import time
-from datetime import date
+import re
+from concurrent.futures import ProcessPoolExecutor
 
-import aiohttp
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+import checkpoint
+import storage
+from engine import Crawler, parse_args
+from sink import Sink
 
 COMPANY = "meta"
 BATCH_SIZE = 100
+RATE = 5  # starting requests per second, adjusted on 429
+META_GRAPHQL_URL = "https://www.metacareers.com/graphql"
+META_JOB_URL = "https://www.metacareers.com/jobs/{job_id}/"
+PARSE_WORKERS = os.cpu_count()
+# only the title, location/description and bullet list elements of a job page are kept
+PARSE_ONLY = SoupStrainer(class_=re.compile(r"(?:^|\s)(?:_9ata|_6hy-|_h46)(?:\s|$)"))
 
-# fields - id, title, locations, teams, sub_teams
+try:
+    import lxml  # noqa: F401
 
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+# fields - id, title, locations, teams, sub_teams
 
-def scrape_all():
-    url = "https://www.metacareers.com/graphql"
 
+def search_request(key=None):
+    """Build the GraphQL request listing every job"""
     payload = "av=170756762778504&__user=0&__a=1&__req=2&__hs=19653.BP%3ADEFAULT.2.0..0.0&dpr=1&__ccg=EXCELLENT&__rev=1009410666&__s=i6f2ns%3Admoynm%3Apox7s6&__hsi=7293178564309851056&__dyn=7xeUmwkHgmwn8K2WnFwn84a2i5U4e1Fx-ewSwMxW4E5S2WdwJw5ux60Vo1upE4W0OE2WxO2O1Vwooa85ufw5Zx61vw4iwBgao881FU2IzXw9S5ryE3bwkE5G0zE5W0HUvzo17U6i68iwfe0Lo6-1FwbO0NE24xG0PE&__csr=&fb_dtsg=NAcNn1SBMZusGftSHn4feEuDV27hVm8I7wOaWvRMeTvZ2uqv9HS95Vg%3A12%3A1696561357&jazoest=25469&lsd=_vlCdw8SblgGjzztJySetV&__spin_r=1009410666&__spin_b=trunk&__spin_t=1698075459&__jssesw=1&fb_api_caller_class=RelayModern&fb_api_req_friendly_name=CareersJobSearchResultsQuery&variables=%7B%22search_input%22%3A%7B%22q%22%3A%22%22%2C%22divisions%22%3A%5B%5D%2C%22offices%22%3A%5B%5D%2C%22roles%22%3A%5B%5D%2C%22leadership_levels%22%3A%5B%5D%2C%22saved_jobs%22%3A%5B%5D%2C%22saved_searches%22%3A%5B%5D%2C%22sub_teams%22%3A%5B%5D%2C%22teams%22%3A%5B%5D%2C%22is_leadership%22%3Afalse%2C%22is_remote_only%22%3Afalse%2C%22sort_by_new%22%3Afalse%2C%22page%22%3A1%2C%22results_per_page%22%3Anull%7D%7D&server_timestamps=true&doc_id=9114524511922157"
     headers = {
         "authority": "www.metacareers.com",
@@ -44,18 +59,28 @@ def scrape_all():
         "x-fb-lsd": "_vlCdw8SblgGjzztJySetV",
     }
 
-    response = requests.request("POST", url, headers=headers, data=payload)
-    return response.json()["data"]["job_search"]
+    return {
+        "method": "POST",
+        "url": META_GRAPHQL_URL,
+        "data": payload,
+        "headers": headers,
+    }
+
 
+async def scrape_all(crawler):
+    """Scrape the job list, a single GraphQL response"""
+    resp = await crawler.fetch_first("job_search", search_request)
+    return resp["data"]["job_search"]
 
-async def parse_html(html):
-    """Parse HTML using beautifulsoup"""
-    soup = BeautifulSoup(html, "html.parser")
+
+def parse_html(html):
+    """Parse a job page with beautifulsoup (lxml when installed)"""
+    soup = BeautifulSoup(html, PARSER, parse_only=PARSE_ONLY)
     result_dict = {}
     result_dict["Title"] = soup.find(class_="_9ata").text
     result_dict["Location"] = soup.find(class_="_6hy-").text
     result_dict["Team_description"] = soup.find(class_="_1n-_ _6hy- _94t2").text
-    div_element = soup.findAll(class_="_h46 _8lfy _8lfy")
+    div_element = soup.find_all(class_="_h46 _8lfy _8lfy")
     result_dict["Responsibilites"] = [
         li.get_text() for li in div_element[0].find_all("li")
     ]
@@ -70,57 +95,57 @@ async def parse_html(html):
     return result_dict
 
 
-async def scrape_single_by_id(session, job_id):
-    """Scrape more job details using job id"""
-    url = f"https://www.metacareers.com/jobs/{job_id}/"
-    async with session.get(url) as resp:
-        try:
-            html = await resp.text()
-            resp = await parse_html(html)
-            return resp
-        except aiohttp.client_exceptions.ContentTypeError:
-            return {}
+def job_request(job_id):
+    """Build the request for the job page of a single job"""
+    url = META_JOB_URL.format(job_id=job_id)
+    return {"method": "GET", "url": url}
 
 
-async def scrape_multiple_by_id(job_ids):
+async def scrape_multiple_by_id(crawler, job_ids):
     """Scrape more job details of multiple jobs using job ids"""
-    conn = aiohttp.TCPConnector(limit=20)
-    tasks = []
-    async with aiohttp.ClientSession(connector=conn) as session:
-        for job_id in job_ids:
-            task = scrape_single_by_id(session, job_id)
-            tasks.append(task)
-        jobs = await asyncio.gather(*tasks)
-    return jobs
-
-
-async def batch_scrape_by_id(job_ids, batch_size=BATCH_SIZE):
-    """Running in batches to avoid running into error 429"""
-    ls_df = []
-    batches = [job_ids[i : i + batch_size] for i in range(0, len(job_ids), BATCH_SIZE)]
-    for idx, batch in enumerate(batches):
-        print(idx)
-        df_job = await scrape_multiple_by_id(batch)
-        df_job = [job for job in df_job if job != {}]
-        df_job = pd.DataFrame(df_job)
-        ls_df.append(df_job)
-        time.sleep(5 * idx)
-    return pd.concat(ls_df)
+    jobs = await crawler.map(job_ids, job_request, parse_html, body="text", default={})
+    return [{"id": job_id, **job} for job_id, job in zip(job_ids, jobs) if job]
 
 
-if __name__ == "__main__":
+@contextlib.asynccontextmanager
+async def detail_crawler():
+    """Crawler of the job pages, parsed in worker processes off the event loop"""
+    with ProcessPoolExecutor(PARSE_WORKERS) as pool:
+        async with Crawler(COMPANY, rate=RATE, executor=pool) as crawler:
+            yield crawler
+
+
+async def save_run1(path: str):
+    """Scrape the job list and write it to the run 1 snapshot"""
+    async with Crawler(COMPANY, rate=RATE) as crawler, Sink(path) as sink:
+        await sink.put(await scrape_all(crawler))
+
+
+async def main(runs=(1, 2), fmt: str = "csv", resume=False, incremental=False):
+    """Scrape the job list (run 1) and then every job page by id (run 2)"""
     os.makedirs("data", exist_ok=True)
+    run1_path = storage.snapshot_path(COMPANY, "-run1", fmt)
+    run2_path = storage.snapshot_path(COMPANY, "-run2", fmt)
 
     # run 1
-    df = pd.DataFrame(scrape_all())
-    df.to_csv(
-        f"data/{COMPANY}-{date.today()}-run1.csv", index=False, encoding="utf-8-sig"
-    )
+    if 1 in runs and not (resume and os.path.exists(run1_path)):
+        await save_run1(run1_path)
+
+    if 2 in runs:
+        # run 2
+        await checkpoint.scrape_details(
+            COMPANY,
+            run1_path,
+            run2_path,
+            detail_crawler(),
+            scrape_multiple_by_id,
+            "id",
+            batch_size=BATCH_SIZE,
+            resume=resume,
+            incremental=incremental,
+        )
 
-    # run 2
-    job_ids = df["id"]
-    # df_job = pd.DataFrame(asyncio.run(scrape_multiple_by_id(job_ids)))
-    df_job = asyncio.run(batch_scrape_by_id(job_ids))
-    df_job.to_csv(
-        f"data/{COMPANY}-{date.today()}-run2.csv", index=False, encoding="utf-8-sig"
-    )
+
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(main(args.runs, args.format, args.resume, args.delta))
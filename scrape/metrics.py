@@ -0,0 +1,151 @@
+"""
+Run metrics of a crawler.
+
+Every Crawler records, per request, the latency, status code and bytes downloaded,
+and per run the retries and where the time went: waiting on the rate limiter,
+waiting for a connection slot, backing off, sending requests, parsing or waiting
+for an executor worker to parse. When the crawler closes, one JSON line
+summarising the run is appended to
+
+    data/{company}-{date}-metrics.jsonl
+
+next to the snapshots, so a slow run can be told apart (network-bound, throttled or
+CPU-bound) without running it again under a profiler. Times in `seconds` are summed
+over concurrent requests, compare them with each other or with `wall_seconds` times
+the concurrency.
+"""
+
+import bisect
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime
+
+METRICS = "data/{company}-{date}-metrics.jsonl"
+# upper bounds of the latency buckets, in seconds
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def summary(self):
+        buckets = {
+            f"<={bound}": count for bound, count in zip(self.buckets, self.counts)
+        }
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 4) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 4),
+            "buckets": buckets,
+        }
+
+
+class RunMetrics:
+    """Counters and timers of one crawler run"""
+
+    def __init__(self, company: str = None):
+        self.company = company
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.latency = Histogram()
+        self.parse = Histogram()
+        self.bytes = 0
+        self.status = Counter()
+        self.retries = Counter()  # error (backoff), throttled, auth
+        self.cache = Counter()  # hit, revalidated, miss
+        self.seconds = Counter()
+        self.failures = 0
+
+    @contextmanager
+    def timer(self, name: str):
+        """Add the time spent in the block to `seconds[name]`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def response(self, latency: float, status: int, size: int):
+        self.latency.observe(latency)
+        self.status[status] += 1
+        self.bytes += size
+        self.seconds["requests"] += latency
+
+    def parsed(self, seconds: float, queued: float = None):
+        """Record an extractor run, `queued` is the time it waited for a worker"""
+        self.parse.observe(seconds)
+        self.seconds["parse"] += seconds
+        if queued is not None:
+            self.seconds["parse_queued"] += queued
+
+    def summary(self):
+        return {
+            "company": self.company,
+            "started": self.started.isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self.start, 3),
+            "requests": self.latency.count,
+            "bytes": self.bytes,
+            "status": {str(status): count for status, count in self.status.items()},
+            "retries": dict(self.retries),
+            "failures": self.failures,
+            "cache": dict(self.cache),
+            "seconds": {name: round(value, 3) for name, value in self.seconds.items()},
+            "latency": self.latency.summary(),
+            "parse": self.parse.summary(),
+        }
+
+    def write(self):
+        """Append the run summary to the company's metrics file, return the path"""
+        summary = self.summary()
+        seconds = summary["seconds"]
+        p50 = summary["latency"]["p50"]
+        # no request was sent: every response cached or nothing left to fetch
+        p50 = "n/a" if p50 is None else f"{p50}s"
+        parse = f"{seconds.get('parse', 0)}s"
+        if "parse_queued" in seconds:
+            parse += f" (+{seconds['parse_queued']}s waiting for a worker)"
+        print(
+            f"{summary['requests']} requests ({self.bytes / 1e6:.1f} MB) in "
+            f"{summary['wall_seconds']}s, p50 {p50}; "
+            f"rate limited {seconds.get('rate_limited', 0)}s, "
+            f"backoff {seconds.get('backoff', 0)}s, parse {parse}"
+        )
+        if self.company is None:
+            return None
+        path = METRICS.format(company=self.company, date=date.today())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as file:
+            file.write(json.dumps(summary) + "\n")
+        return path
@@ -8,149 +8,126 @@ URL
 2. Detailed job description by ID: https://gcsservices.careers.microsoft.com/search/api/v1/job/1696314?lang=en_us
   - Response body fields: ['operationResult', 'errorInfo']
     - 'operationResult' fields: ['result', 'status', 'quality', 'errorCode']
-      - 'result' fields: ['jobId', 'title', 'category', 'roleType', 'travelPercentage', 'posted', 'unposted', 
-      'jobType', 'subcategory', 'employmentType', 'description', 'qualifications', 'responsibilities', 
+      - 'result' fields: ['jobId', 'title', 'category', 'roleType', 'travelPercentage', 'posted', 'unposted',
+      'jobType', 'subcategory', 'employmentType', 'description', 'qualifications', 'responsibilities',
       'primaryWorkLocation', 'workLocations', 'educationLevel', 'workSiteFlexibility', 'jobStatus', 'closedDate']
 
-The code will take about 15 minutes to run as we are scraping by batch
+Job details are paced by the crawler's adaptive rate limiter instead of sleeping
+between batches
 """
 
 import asyncio
 import json
 import math
 import os
-import time
 from datetime import date
+from typing import Any
 
-import aiohttp
-import pandas as pd
-import requests
+import checkpoint
+import storage
+from engine import Crawler, parse_args
+from fastjson import Schema
+from sink import Sink
 
 COMPANY = "microsoft"
 PAGE_SIZE = 20
 BATCH_SIZE = 200
+RATE = 5  # starting requests per second, adjusted on 403/429
 MICROSOFT_URL = "https://gcsservices.careers.microsoft.com/search/api/v1/search?l=en_us&pg={page}&pgSz={page_size}&o=Relevance&flt=true"
 MICROSOFT_JOB_DETAIL_URL = (
     "https://gcsservices.careers.microsoft.com/search/api/v1/job/{job_id}?lang=en_us"
 )
+# only the fields that are used are decoded
+FIRST_PAGE = Schema(
+    {"operationResult": {"result": {"totalJobs": int, "filters": Any, "jobs": list}}},
+    "MicrosoftFirstPage",
+)
+JOBS_PAGE = Schema({"operationResult": {"result": {"jobs": list}}}, "MicrosoftJobsPage")
+JOB_DETAIL = Schema({"operationResult": {"result": Any}}, "MicrosoftJobDetail")
 
 # dict key from response body - ['searchId', 'totalJobs', 'filters', 'jobs', 'id']
 
 
-def scrape_single(page: int):
-    """Scrape a single page of microsoft career website"""
+def page_request(page: int):
+    """Build the request for a single page of microsoft career website"""
     url = MICROSOFT_URL.format(page=page, page_size=PAGE_SIZE)
-    with requests.get(url) as resp:
-        resp_json = resp.json()
+    return {"method": "GET", "url": url}
 
-    # result that we are interested at is in operationalResult and result
-    key_dict = resp_json["operationResult"]["result"]
-    return key_dict
 
+def job_request(job_id):
+    """Build the request for the details of a single job"""
+    url = MICROSOFT_JOB_DETAIL_URL.format(job_id=job_id)
+    return {"method": "GET", "url": url}
 
-async def scrape_single_async(session, page: int):
-    """Scrape a single page of microsoft career website"""
-    url = MICROSOFT_URL.format(page=page, page_size=PAGE_SIZE)
-    async with session.get(url) as resp:
-        resp_json = await resp.json()
 
+def extract_result(resp_json):
     # result that we are interested at is in operationalResult and result
-    key_dict = resp_json["operationResult"]["result"]
-    return key_dict
+    return resp_json["operationResult"]["result"]
 
 
-def get_total_record():
-    """Get the total number of jobs"""
-    key_dict = scrape_single(1)
-    total = key_dict["totalJobs"]
-    print(f"Total jobs: {total}")
-    return total
+def extract_jobs(resp_json):
+    return extract_result(resp_json)["jobs"]
 
 
-def get_filter():
-    """Get all available filters"""
-    key_dict = scrape_single(1)
-    return key_dict["filters"]
-
+def save_filters(filters):
+    """Save the available filters next to the snapshots"""
+    with open(f"data/{COMPANY}-filter-{date.today()}.json", "w") as file:
+        json.dump(filters, file, indent=4, sort_keys=True)
 
-async def get_all_pages_async():
-    """Scrape all page and append to a dataframe"""
-    total_record = get_total_record()
-    total_page = math.ceil(total_record / PAGE_SIZE)
-    tasks = []
-    async with aiohttp.ClientSession() as session:
-        for page in range(1, total_page + 1):
-            task = scrape_single_async(session, page)
-            tasks.append(task)
-        jobs = await asyncio.gather(*tasks)
-    result = [job["jobs"] for job in jobs]
-    result = [job for single_page in result for job in single_page]
-    return result
 
+async def get_all_pages_async(path: str):
+    """Scrape all page and stream the job cards to a csv
 
-async def scrape_single_by_id(session, job_id):
-    """Scrape more job details using job id"""
-    url = MICROSOFT_JOB_DETAIL_URL.format(job_id=job_id)
-    async with session.get(url) as resp:
-        try:
-            resp_json = await resp.json()
-            return resp_json["operationResult"]["result"]
-        except aiohttp.client_exceptions.ContentTypeError:
-            print(f"Failed to scrape {job_id}")
-            return {}
+    Page 1 is fetched once, for the total, the filters and its own jobs.
+    """
+    async with Crawler(COMPANY, rate=RATE) as crawler, Sink(path) as sink:
+        result = extract_result(await crawler.fetch_first(1, page_request, FIRST_PAGE))
+        total_record = result["totalJobs"]
+        print(f"Total jobs: {total_record}")
+        save_filters(result["filters"])
+        await sink.put(result["jobs"])
+        pages = range(2, math.ceil(total_record / PAGE_SIZE) + 1)
+        async for jobs in crawler.stream(
+            pages, page_request, extract_jobs, body=JOBS_PAGE
+        ):
+            await sink.put(jobs)
 
 
-async def scrape_multiple_by_id(job_ids):
+async def scrape_multiple_by_id(crawler, job_ids):
     """Scrape more job details of multiple jobs using job ids"""
-    conn = aiohttp.TCPConnector(limit=20)
-    tasks = []
-    async with aiohttp.ClientSession(connector=conn) as session:
-        for job_id in job_ids:
-            task = scrape_single_by_id(session, job_id)
-            tasks.append(task)
-        jobs = await asyncio.gather(*tasks)
-        return jobs
-
-
-async def batch_scrape_by_id(job_ids, batch_size=BATCH_SIZE):
-    """Running in batches to avoid running into error 403"""
-    ls_df = []
-    batches = [job_ids[i : i + batch_size] for i in range(0, len(job_ids), batch_size)]
-    for idx, batch in enumerate(batches):
-        if idx != 0:
-            sleep_duration = 60  # 5 * random.randrange(4, 7)
-            print(f"Sleep for {sleep_duration} seconds")
-            time.sleep(sleep_duration)
-        print(idx)
-        print("Input length:", len(batch))
-        jobs = await scrape_multiple_by_id(batch)
-        jobs = [job for job in jobs if job != {} and job is not None]
-        print("Output length:", len(jobs))
-        df_job = pd.DataFrame(jobs)
-        ls_df.append(df_job)
-    return pd.concat(ls_df)
+    return await crawler.map(
+        job_ids, job_request, extract_result, body=JOB_DETAIL, default={}
+    )
 
 
-if __name__ == "__main__":
+async def main(runs=(1, 2), fmt: str = "csv", resume=False, incremental=False):
+    """Scrape the job cards (run 1) and then every job by id (run 2)"""
     os.makedirs("data", exist_ok=True)
+    run1_path = storage.snapshot_path(COMPANY, "-run1", fmt)
+    run2_path = storage.snapshot_path(COMPANY, "-run2", fmt)
+
+    if 1 in runs and not (resume and os.path.exists(run1_path)):
+        # run 1: scrape the job cards and save various filters
+        await get_all_pages_async(run1_path)
+
+    if 2 in runs:
+        # run 2: scrape each job by job ID
+        await checkpoint.scrape_details(
+            COMPANY,
+            run1_path,
+            run2_path,
+            Crawler(COMPANY, rate=RATE),
+            scrape_multiple_by_id,
+            "jobId",
+            "postingDate",
+            BATCH_SIZE,
+            resume,
+            incremental,
+        )
 
-    # save various filters
-    with open(f"data/{COMPANY}-filter-{date.today()}.json", "w") as file:
-        json.dump(get_filter(), file, indent=4, sort_keys=True)
 
-    # run 1: scrape the job cards
-    df = pd.DataFrame(asyncio.run(get_all_pages_async()))
-    df.to_csv(
-        f"data/{COMPANY}-{date.today()}-run1.csv", index=False, encoding="utf-8-sig"
-    )
-
-    # run 2: scrape each job by job ID
-    job_ids = df["jobId"]
-    # df_job = pd.DataFrame(asyncio.run(scrape_multiple_by_id(job_ids)))
-    df_job = asyncio.run(batch_scrape_by_id(job_ids))
-    print("Final number of jobs: ", df_job.shape)
-    df_job.to_csv(
-        f"data/{COMPANY}-{date.today()}-run2.csv", index=False, encoding="utf-8-sig"
-    )
+if __name__ == "__main__":
+    args = parse_args()
+    asyncio.run(main(args.runs, args.format, args.resume, args.delta))
 
 # fields of jobs - jobId, title, postingDate, properties (description, locations, primaryLocation, workSiteFlexibility, profession, discipline, jobType, roleType, employmentType, educationLevel)
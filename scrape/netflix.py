@@ -8,61 +8,51 @@ import asyncio
 import json
 import math
 import os
-from datetime import date
-
-import aiohttp
-import pandas as pd
-import requests
 
+import storage
+from engine import Crawler, parse_args
+from sink import Sink
 
 COMPANY = "netflix"
 PAGE_SIZE = 20
 NETFLIX_URL = "https://jobs.netflix.com/api/search?page={page}"
 
 
-def scrape_single(page: int):
-    """Scrape a single page of microsoft career website"""
+def page_request(page: int):
+    """Build the request for a single page of netflix career website"""
     url = NETFLIX_URL.format(page=page)
-    with requests.get(url) as resp:
-        resp_json = resp.json()
-        return resp_json
-
+    return {"method": "GET", "url": url}
 
-async def scrape_single_async(session, page: int):
-    """Scrape a single page of microsoft career website"""
-    url = NETFLIX_URL.format(page=page)
-    async with session.get(url) as resp:
-        resp_json = await resp.json()
-        return resp_json
 
+def extract_jobs(resp_json):
+    return resp_json["records"]["postings"]
 
-def get_total_records():
-    """Get the total number of jobs"""
-    key_dict = scrape_single(1)
-    total = key_dict["info"]["postings"]["total_result_count"]
-    print(f"Total jobs: {total}")
-    return total
 
+async def get_all_pages_async(path: str):
+    """Scrape all page and stream the jobs to a csv
 
-async def get_all_pages_async():
-    """Scrape all page and append to a dataframe"""
-    total_record = get_total_records()
-    total_page = math.ceil(total_record / PAGE_SIZE)
-    tasks = []
-    async with aiohttp.ClientSession() as session:
-        for page in range(1, total_page + 1):
-            task = scrape_single_async(session, page)
-            tasks.append(task)
-        result = await asyncio.gather(*tasks)
-    result = [item for sublist in result for item in sublist["records"]["postings"]]
-    return result
+    Page 1 is fetched once, for the total and its own jobs.
+    """
+    async with Crawler(COMPANY) as crawler, Sink(path) as sink:
+        first_page = await crawler.fetch_first(1, page_request)
+        total_record = first_page["info"]["postings"]["total_result_count"]
+        print(f"Total jobs: {total_record}")
+        await sink.put(extract_jobs(first_page))
+        pages = range(2, math.ceil(total_record / PAGE_SIZE) + 1)
+        async for jobs in crawler.stream(pages, page_request, extract_jobs):
+            await sink.put(jobs)
 
 
-if __name__ == "__main__":
+async def main(runs=(1,), fmt: str = "csv", resume=False, incremental=False):
+    """Scrape the job postings, Netflix only has run 1"""
+    if 1 not in runs:
+        return
     os.makedirs("data", exist_ok=True)
 
     # save the jobs description
-    result = asyncio.run(get_all_pages_async())
-    pd.DataFrame(result).to_csv(
-        f"data/{COMPANY}-{date.today()}.csv", index=False, encoding="utf-8-sig"
-    )
+    await get_all_pages_async(storage.snapshot_path(COMPANY, fmt=fmt))
+
+
+if __name__ == "__main__":
+    args = parse_args(runs=False)
+    asyncio.run(main(fmt=args.format))
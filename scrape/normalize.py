@@ -0,0 +1,363 @@
+"""
+Normalize every company's snapshot into one typed job schema.
+
+Each scraper saves the raw fields of its site (Amazon `jobs[]`, Google `jobs[]`,
+Netflix `records.postings`, Microsoft `operationResult.result`, Apple
+`searchResults`, Meta `job_search` + job pages). This stage maps them all to
+
+    id, company, title, locations, team, category, posted_date, description,
+    qualifications
+
+and writes them to a single Parquet dataset partitioned by company and date:
+
+    data/jobs/company=amazon/date=2023-05-21/part-0.parquet
+
+so cross-company analysis is one load and one vectorized pass:
+
+    jobs = load_jobs(columns=["company", "category"], dates=partition_dates()[-1:])
+
+The facet counts of every raw snapshot are saved on the way (see aggregate.py) and
+the jobs are merged into the posting history (see history.py) and indexed for search
+(see search.py).
+
+Usage: python scrape/normalize.py [--date 2023-05-21] [company ...]
+"""
+
+import argparse
+import ast
+import json
+import os
+import shutil
+from datetime import date
+
+import pandas as pd
+
+import storage
+from aggregate import write_facets
+from history import History
+from search import SearchIndex
+
+DATASET = "data/jobs"
+COLUMNS = [
+    "id",
+    "company",
+    "title",
+    "locations",
+    "team",
+    "category",
+    "posted_date",
+    "description",
+    "qualifications",
+]
+
+
+def parse_nested(value):
+    """Undo the serialisation of list/dict fields (JSON in Parquet, repr in CSV)"""
+    if not isinstance(value, str) or value[:1] not in "[{":
+        return value
+    for loads in (json.loads, ast.literal_eval):
+        try:
+            return loads(value)
+        except (ValueError, SyntaxError):
+            continue
+    return value
+
+
+def column(df, name):
+    """A column of the raw snapshot, or an empty one when the site did not send it"""
+    if name in df:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype="object")
+
+
+def join_text(*series):
+    """Join text columns row-wise, skipping missing values"""
+    text = series[0].astype("string").fillna("")
+    for other in series[1:]:
+        text = text.str.cat(other.astype("string").fillna(""), sep="\n")
+    text = text.str.strip()
+    return text.mask(text == "")
+
+
+def names(value, key=None):
+    """Turn a list of locations (strings or dicts) into a list of names"""
+    value = parse_nested(value)
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    result = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get(key) if key else next(iter(item.values()), None)
+        if item:
+            result.append(str(item))
+    return result
+
+
+def lines(value):
+    """Join a list of bullet points (Meta job pages) into text"""
+    return "\n".join(names(value))
+
+
+def team_name(value):
+    """Apple sends the team as {"teamName": ..., "teamID": ..., "teamCode": ...}"""
+    value = parse_nested(value)
+    return value.get("teamName") if isinstance(value, dict) else None
+
+
+def amazon(df):
+    return pd.DataFrame(
+        {
+            "id": column(df, "id_icims"),
+            "title": column(df, "title"),
+            "locations": column(df, "normalized_location").map(names),
+            "team": column(df, "job_family"),
+            "category": column(df, "job_category"),
+            "posted_date": column(df, "posted_date"),
+            "description": column(df, "description"),
+            "qualifications": join_text(
+                column(df, "basic_qualifications"),
+                column(df, "preferred_qualifications"),
+            ),
+        }
+    )
+
+
+def google(df):
+    return pd.DataFrame(
+        {
+            "id": column(df, "id").astype("string").str.replace("jobs/", ""),
+            "title": column(df, "title"),
+            "locations": column(df, "locations").map(lambda v: names(v, "display")),
+            "team": column(df, "company_name"),
+            "category": column(df, "categories").map(lambda v: ", ".join(names(v))),
+            "posted_date": column(df, "publish_date"),
+            "description": join_text(
+                column(df, "description"), column(df, "responsibilities")
+            ),
+            "qualifications": column(df, "qualifications"),
+        }
+    )
+
+
+def netflix(df):
+    return pd.DataFrame(
+        {
+            "id": column(df, "external_id").fillna(column(df, "id")),
+            "title": column(df, "text"),
+            "locations": column(df, "location").map(names),
+            "team": column(df, "team"),
+            "category": column(df, "subteam"),
+            "posted_date": column(df, "created_at"),
+            "description": column(df, "description"),
+            "qualifications": None,
+        }
+    )
+
+
+def microsoft(df):
+    return pd.DataFrame(
+        {
+            "id": column(df, "jobId"),
+            "title": column(df, "title"),
+            "locations": column(df, "workLocations").map(names),
+            "team": column(df, "subcategory"),
+            "category": column(df, "category"),
+            "posted_date": column(df, "posted"),
+            "description": join_text(
+                column(df, "description"), column(df, "responsibilities")
+            ),
+            "qualifications": column(df, "qualifications"),
+        }
+    )
+
+
+def apple(df):
+    return pd.DataFrame(
+        {
+            "id": column(df, "positionId").fillna(column(df, "id")),
+            "title": column(df, "postingTitle"),
+            "locations": column(df, "locations").map(lambda v: names(v, "name")),
+            "team": column(df, "team").map(team_name),
+            "category": None,
+            "posted_date": column(df, "postDateInGMT"),
+            "description": column(df, "jobSummary"),
+            "qualifications": join_text(
+                column(df, "minimumQualifications"),
+                column(df, "preferredQualifications"),
+            ),
+        }
+    )
+
+
+def meta(df):
+    return pd.DataFrame(
+        {
+            "id": column(df, "id"),
+            "title": column(df, "title").fillna(column(df, "Title")),
+            "locations": column(df, "locations").map(names),
+            "team": column(df, "teams").map(lambda v: ", ".join(names(v))),
+            "category": column(df, "sub_teams").map(lambda v: ", ".join(names(v))),
+            "posted_date": None,
+            "description": join_text(
+                column(df, "Team_description"), column(df, "Responsibilites").map(lines)
+            ),
+            "qualifications": join_text(
+                column(df, "Minimum_qualifications").map(lines),
+                column(df, "Preferred_qualifications").map(lines),
+            ),
+        }
+    )
+
+
+NORMALIZERS = {
+    "amazon": amazon,
+    "google": google,
+    "netflix": netflix,
+    "microsoft": microsoft,
+    "apple": apple,
+    "meta": meta,
+}
+# snapshots holding the most detailed records of each company, merged on id
+SNAPSHOTS = {
+    "amazon": [""],
+    "google": [""],
+    "netflix": [""],
+    "microsoft": ["-run2"],
+    "apple": ["-run1", "-run2"],
+    "meta": ["-run1", "-run2"],
+}
+ID_COLUMNS = {"apple": "id", "meta": "id"}
+
+
+def find_snapshot(company: str, day: str, suffix: str):
+    """Path of a snapshot in any format, blocks and Parquet first, or None"""
+    for fmt in ("blocks", "parquet", "csv"):
+        path = storage.SNAPSHOT.format(
+            company=company, date=day, suffix=suffix, fmt=storage.EXTENSIONS[fmt]
+        )
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def read_raw(company: str, day: str):
+    """Read (and merge) the raw snapshots of a company for a day"""
+    frames = []
+    for suffix in SNAPSHOTS[company]:
+        path = find_snapshot(company, day, suffix)
+        if path is not None:
+            frames.append(storage.read_snapshot(path))
+    if not frames:
+        return None
+    df = frames[0]
+    for other in frames[1:]:
+        key = ID_COLUMNS[company]
+        if key in other:
+            df[key] = df[key].astype("string")
+            other[key] = other[key].astype("string")
+            df = df.merge(other, on=key, how="left", suffixes=("", "_detail"))
+    return df
+
+
+def normalize(company: str, df):
+    """Map the raw records of a company to the common schema"""
+    jobs = NORMALIZERS[company](df)
+    jobs["company"] = company
+    jobs["id"] = jobs["id"].astype("string")
+    jobs["posted_date"] = pd.to_datetime(
+        jobs["posted_date"], errors="coerce", utc=True, format="mixed"
+    ).dt.date
+    return jobs[COLUMNS].drop_duplicates("id")
+
+
+def arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            pa.field("id", pa.string()),
+            pa.field("company", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("title", pa.string()),
+            pa.field("locations", pa.list_(pa.string())),
+            pa.field("team", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("category", pa.dictionary(pa.int32(), pa.string())),
+            pa.field("posted_date", pa.date32()),
+            pa.field("description", pa.string()),
+            pa.field("qualifications", pa.string()),
+        ]
+    )
+
+
+def write_partition(jobs, company: str, day: str, root: str = DATASET):
+    """Replace the company/date partition of the dataset"""
+    storage._require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = os.path.join(root, f"company={company}", f"date={day}")
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    # company and date are encoded in the partition path
+    table = pa.Table.from_pandas(jobs, schema=arrow_schema(), preserve_index=False)
+    table = table.drop_columns(["company"])
+    pq.write_table(table, os.path.join(directory, "part-0.parquet"))
+    return directory
+
+
+def partition_dates(root: str = DATASET):
+    """Sorted dates with a partition in the dataset"""
+    days = set()
+    for company in os.listdir(root):
+        for name in os.listdir(os.path.join(root, company)):
+            if name.startswith("date="):
+                days.add(name[len("date=") :])
+    return sorted(days)
+
+
+def load_jobs(columns=None, companies=None, dates=None, root: str = DATASET):
+    """Load the normalized dataset, optionally only some columns and partitions
+
+    Without `dates` every daily partition is read, the whole history: a posting
+    open for a month comes up once a day. Pass e.g. `dates=partition_dates()[-1:]`
+    for one snapshot per posting.
+    """
+    storage._require_pyarrow()
+    filters = []
+    if companies:
+        filters.append(("company", "in", list(companies)))
+    if dates:
+        filters.append(("date", "in", [str(day) for day in dates]))
+    return pd.read_parquet(root, columns=columns, filters=filters or None)
+
+
+def ingest(companies=None, day: str = None):
+    """Normalize the snapshots of a day into the dataset"""
+    day = day or str(date.today())
+    history = History()
+    search = SearchIndex()
+    for company in companies or NORMALIZERS:
+        df = read_raw(company, day)
+        if df is None:
+            print(f"No {company} snapshot for {day}")
+            continue
+        write_facets(company, day, df)
+        jobs = normalize(company, df)
+        directory = write_partition(jobs, company, day)
+        print(f"Normalized {len(jobs)} {company} jobs into {directory}")
+        history.merge(company, day, jobs)
+        search.update(company, jobs)
+    history.close()
+    search.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("companies", nargs="*", metavar="company")
+    parser.add_argument("--date", default=str(date.today()))
+    args = parser.parse_args()
+    unknown = set(args.companies) - set(NORMALIZERS)
+    if unknown:
+        parser.error(f"unknown companies: {', '.join(sorted(unknown))}")
+    ingest(args.companies, args.date)
@@ -0,0 +1,83 @@
+"""
+Adaptive per-host rate limiter.
+
+A token bucket whose refill rate follows AIMD: every successful response adds a small
+constant to the rate, every throttling response (429/403) halves it. A `Retry-After`
+header pauses the whole host for the requested time, so workers wait without
+blocking the event loop instead of sleeping a fixed time between batches.
+"""
+
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+
+RATE = 10.0  # requests per second to start with
+MIN_RATE = 0.2
+MAX_RATE = 50.0
+INCREASE = 0.1  # added to the rate after every successful response
+DECREASE = 0.5  # rate multiplier after a throttling response
+COOLDOWN = 1.0  # throttling responses within this window only decrease once
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RateLimiter:
+    """Token bucket with an AIMD-adjusted refill rate"""
+
+    def __init__(
+        self,
+        rate: float = RATE,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+        burst: float = None,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request may be sent"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                elapsed = now - self.updated
+                self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + INCREASE)
+
+    def on_throttle(self, retry_after: float = None):
+        now = time.monotonic()
+        if now - self.last_decrease > COOLDOWN:
+            self.rate = max(self.min_rate, self.rate * DECREASE)
+            self.last_decrease = now
+        self.tokens = 0
+        delay = retry_after if retry_after is not None else 1 / self.rate
+        self.paused_until = max(self.paused_until, now + delay)
@@ -0,0 +1,40 @@
+"""
+Retry policy shared by the crawlers.
+
+Failed requests are retried with capped, fully jittered exponential backoff. Each host
+has a retry budget that only lets a fraction of its requests be retried, so a site
+that is down fails fast instead of multiplying the load.
+"""
+
+import random
+
+MAX_ATTEMPTS = 4
+BASE_DELAY = 0.5  # seconds
+MAX_DELAY = 30.0  # seconds
+BUDGET_RATIO = 0.2  # retries allowed per request sent
+BUDGET_MINIMUM = 10  # retries always allowed, even before many requests were sent
+
+
+def backoff(attempt: int, base: float = BASE_DELAY, cap: float = MAX_DELAY):
+    """Delay before the given retry attempt (0-based), with full jitter"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class RetryBudget:
+    """Caps the number of retries to a fraction of the requests sent to a host"""
+
+    def __init__(self, ratio: float = BUDGET_RATIO, minimum: int = BUDGET_MINIMUM):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+
+    def record_request(self):
+        self.requests += 1
+
+    def spend(self):
+        """Take one retry from the budget, return False when it is exhausted"""
+        if self.retries >= self.minimum + self.ratio * self.requests:
+            return False
+        self.retries += 1
+        return True
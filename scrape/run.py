@@ -0,0 +1,71 @@
+"""
+Run several company scrapers concurrently in one event loop.
+
+Every company keeps its own Crawler, so each host still gets its own connection
+limit and adaptive rate budget; only the event loop is shared. A company that fails
+does not stop the others, the failures are reported at the end.
+
+Usage:
+
+    python scrape/run.py                               # every company, run 1 and 2
+    python scrape/run.py microsoft meta --runs 2 --resume
+    python scrape/run.py amazon google --format parquet
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import amazon
+import apple
+import google
+import meta
+import microsoft
+import netflix
+from engine import parse_args
+
+COMPANIES = {
+    "amazon": amazon,
+    "google": google,
+    "netflix": netflix,
+    "microsoft": microsoft,
+    "apple": apple,
+    "meta": meta,
+}
+
+
+async def run_company(name: str, runs, fmt: str, resume: bool, incremental: bool):
+    """Run one company scraper and report how long it took"""
+    start = time.monotonic()
+    print(f"[{name}] started")
+    await COMPANIES[name].main(runs, fmt, resume, incremental)
+    print(f"[{name}] finished in {time.monotonic() - start:.0f}s")
+
+
+async def run_all(companies, runs=(1, 2), fmt="csv", resume=False, incremental=False):
+    """Run the scrapers concurrently, return the companies that failed"""
+    results = await asyncio.gather(
+        *(run_company(name, runs, fmt, resume, incremental) for name in companies),
+        return_exceptions=True,
+    )
+    failed = []
+    for name, result in zip(companies, results):
+        if isinstance(result, BaseException):
+            print(f"[{name}] failed: {result!r}")
+            failed.append(name)
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("companies", nargs="*", metavar="company")
+    args = parse_args(parser)
+    unknown = set(args.companies) - set(COMPANIES)
+    if unknown:
+        parser.error(f"unknown companies: {', '.join(sorted(unknown))}")
+    companies = args.companies or list(COMPANIES)
+    failed = asyncio.run(
+        run_all(companies, args.runs, args.format, args.resume, args.delta)
+    )
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,206 @@
+"""
+Full-text search over the postings of every company.
+
+The latest normalized jobs of each company are kept in a SQLite FTS5 index
+(title, description, qualifications, locations) next to a table of their facets
+(company, category, team), so questions like "which postings mention Kubernetes and
+Rust in Singapore" are one indexed query instead of a scan of every DataFrame:
+
+    index = SearchIndex()
+    index.search("kubernetes AND rust", location="Singapore")
+    index.search('"c++" NOT java', company=["google", "meta"], limit=20)
+
+Queries use the FTS5 syntax (AND, OR, NOT, "phrases", prefix*). The index is
+updated by `python scrape/normalize.py`: only the postings that are new, changed
+(content hash) or gone since the company's previous snapshot are rewritten.
+
+Usage: python scrape/search.py "kubernetes AND rust" [--company amazon]
+       [--category ...] [--location Singapore] [--limit 20]
+"""
+
+import argparse
+import os
+import sqlite3
+
+import pandas as pd
+
+import text
+from history import content_hash
+
+SEARCH = "data/search.sqlite"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    rowid INTEGER PRIMARY KEY,
+    company TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT,
+    locations TEXT,
+    team TEXT,
+    category TEXT,
+    posted_date TEXT,
+    content_hash INTEGER NOT NULL,
+    UNIQUE (company, id)
+);
+CREATE INDEX IF NOT EXISTS jobs_category ON jobs (category);
+CREATE INDEX IF NOT EXISTS jobs_team ON jobs (team);
+-- '+' and '#' are part of words: c++, c#
+CREATE VIRTUAL TABLE IF NOT EXISTS postings USING fts5 (
+    title, description, qualifications, locations,
+    tokenize = "unicode61 tokenchars '+#'"
+);
+CREATE TEMP TABLE IF NOT EXISTS incoming (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    locations TEXT,
+    team TEXT,
+    category TEXT,
+    posted_date TEXT,
+    description TEXT,
+    qualifications TEXT,
+    content_hash INTEGER
+);
+"""
+# postings of the company that are gone or changed since the last update
+STALE = """
+SELECT jobs.rowid, incoming.id IS NULL
+FROM jobs LEFT JOIN incoming ON incoming.id = jobs.id
+WHERE jobs.company = :company
+    AND (incoming.id IS NULL OR incoming.content_hash != jobs.content_hash)
+"""
+FACETS = ("company", "category", "team")
+
+
+def join_locations(value):
+    if isinstance(value, str) or value is None:
+        return value
+    try:
+        return "; ".join(str(location) for location in value)
+    except TypeError:
+        return None
+
+
+def strip_html(series):
+    return series.astype("string").str.replace(text.HTML_TAG, " ", regex=True)
+
+
+def quote(value: str):
+    """FTS5 string literal"""
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class SearchIndex:
+    """FTS5 index of the latest postings of every company"""
+
+    def __init__(self, path: str = SEARCH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def update(self, company: str, jobs):
+        """Replace the company's postings by a new snapshot of its normalized jobs
+
+        Returns the number of postings (re)indexed and removed.
+        """
+        jobs = jobs.drop_duplicates("id")
+        incoming = pd.DataFrame(
+            {
+                "id": jobs["id"].astype(str),
+                "title": jobs["title"].astype("string"),
+                "locations": jobs["locations"].map(join_locations).astype("string"),
+                "team": jobs["team"].astype("string"),
+                "category": jobs["category"].astype("string"),
+                "posted_date": jobs["posted_date"].astype("string"),
+                "description": strip_html(jobs["description"]),
+                "qualifications": strip_html(jobs["qualifications"]),
+                "content_hash": content_hash(jobs),
+            }
+        )
+        rows = incoming.astype(object).where(incoming.notna(), None)
+        params = {"company": company}
+        with self.db:
+            self.db.execute("DELETE FROM incoming")
+            self.db.executemany(
+                f"INSERT INTO incoming VALUES ({', '.join('?' * incoming.shape[1])})",
+                rows.itertuples(index=False),
+            )
+            stale = self.db.execute(STALE, params).fetchall()
+            removed = sum(gone for _, gone in stale)
+            rowids = [(rowid,) for rowid, _ in stale]
+            self.db.executemany("DELETE FROM postings WHERE rowid = ?", rowids)
+            self.db.executemany("DELETE FROM jobs WHERE rowid = ?", rowids)
+            (last,) = self.db.execute(
+                "SELECT COALESCE(MAX(rowid), 0) FROM jobs"
+            ).fetchone()
+            self.db.execute(
+                """
+                INSERT INTO jobs (company, id, title, locations, team, category,
+                    posted_date, content_hash)
+                SELECT :company, id, title, locations, team, category, posted_date,
+                    content_hash
+                FROM incoming
+                WHERE id NOT IN (SELECT id FROM jobs WHERE company = :company)
+                """,
+                params,
+            )
+            indexed = self.db.execute(
+                """
+                INSERT INTO postings (rowid, title, description, qualifications,
+                    locations)
+                SELECT jobs.rowid, incoming.title, incoming.description,
+                    incoming.qualifications, incoming.locations
+                FROM jobs JOIN incoming ON incoming.id = jobs.id
+                WHERE jobs.company = :company AND jobs.rowid > :last
+                """,
+                {**params, "last": last},
+            ).rowcount
+        print(
+            f"Search index of {company}: {indexed} postings indexed, {removed} removed"
+        )
+        return indexed, removed
+
+    def search(self, query: str, location: str = None, limit: int = 100, **facets):
+        """Postings matching an FTS5 query, best first
+
+        `location` matches a word or phrase of the locations; `company`, `category`
+        and `team` take a value or a list of values.
+        """
+        if location is not None:
+            query = f"({query}) AND locations : {quote(location)}"
+        sql = """
+            SELECT jobs.company, jobs.id, jobs.title, jobs.locations, jobs.team,
+                jobs.category, jobs.posted_date, bm25(postings) AS rank
+            FROM postings JOIN jobs ON jobs.rowid = postings.rowid
+            WHERE postings MATCH ?
+        """
+        params = [query]
+        for facet, values in facets.items():
+            if facet not in FACETS:
+                raise KeyError(f"{facet} is not a facet, use one of {FACETS}")
+            if isinstance(values, str):
+                values = [values]
+            sql += f" AND jobs.{facet} IN ({', '.join('?' * len(values))})"
+            params.extend(values)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        return pd.read_sql_query(sql, self.db, params=params)
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("query", help='FTS5 query, e.g. "kubernetes AND rust"')
+    parser.add_argument("--company", nargs="+")
+    parser.add_argument("--category", nargs="+")
+    parser.add_argument("--location")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    facets = {
+        facet: getattr(args, facet)
+        for facet in ("company", "category")
+        if getattr(args, facet)
+    }
+    results = SearchIndex().search(args.query, args.location, args.limit, **facets)
+    with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+        print(results.to_string(index=False))
@@ -0,0 +1,122 @@
+"""
+Streaming snapshot output.
+
+Records are appended to the CSV (or Parquet, see storage.py) batch by batch as pages
+arrive instead of being collected into one DataFrame first, so memory stays bounded
+by the queue size no matter how many postings are scraped.
+
+    async with Sink(path) as sink:
+        async for jobs in crawler.stream(pages, page_request, extract_jobs):
+            await sink.put(jobs)
+"""
+
+import asyncio
+import os
+
+import pandas as pd
+
+from storage import ParquetWriter
+
+QUEUE_SIZE = 8  # batches waiting to be written before producers are paused
+
+
+class CsvWriter:
+    """Append record batches to a CSV
+
+    The first batch decides the columns. A later batch bringing new ones rewrites
+    the file with them, empty in the rows already written, like one DataFrame of
+    all the records would have them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.columns = None
+        self.count = 0
+
+    def write(self, records):
+        df = pd.DataFrame(records)
+        if df.empty:
+            return
+        if self.columns is None:
+            self.columns = list(df.columns)
+            # only the start of the file gets the byte order mark
+            df.to_csv(self.path, index=False, encoding="utf-8-sig")
+        else:
+            extra = [col for col in df.columns if col not in self.columns]
+            if extra:
+                self.widen(extra)
+            df = df.reindex(columns=self.columns)
+            df.to_csv(self.path, mode="a", header=False, index=False, encoding="utf-8")
+        self.count += len(df)
+
+    def widen(self, extra, chunksize: int = 10000):
+        """Rewrite the rows written so far with the new columns added to the header"""
+        self.columns += extra
+        tmp = self.path + ".tmp"
+        chunks = pd.read_csv(
+            self.path,
+            dtype=str,
+            keep_default_na=False,
+            chunksize=chunksize,
+            encoding="utf-8-sig",
+        )
+        for i, chunk in enumerate(chunks):
+            chunk.reindex(columns=self.columns).to_csv(
+                tmp,
+                mode="a" if i else "w",
+                header=not i,
+                index=False,
+                encoding="utf-8" if i else "utf-8-sig",
+            )
+        os.replace(tmp, self.path)
+
+    def close(self):
+        pass
+
+
+def writer_for(path: str):
+    """Pick the writer from the file extension"""
+    if path.endswith(".parquet"):
+        return ParquetWriter(path)
+    return CsvWriter(path)
+
+
+class Sink:
+    """Async consumer writing the batches put on its queue to a snapshot file"""
+
+    def __init__(self, path: str, maxsize: int = QUEUE_SIZE):
+        self.writer = writer_for(path)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.consumer = None
+
+    @property
+    def count(self):
+        return self.writer.count
+
+    async def __aenter__(self):
+        self.consumer = asyncio.create_task(self.consume())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # a writer that failed no longer drains the queue, raise its error instead
+        if not self.consumer.done():
+            await self.queue.put(None)
+        await self.consumer
+        self.writer.close()
+        print(f"Saved {self.count} records to {self.writer.path}")
+
+    async def put(self, records):
+        """Queue a batch of records, waits while the writer is behind"""
+        if not records:
+            return
+        put = asyncio.ensure_future(self.queue.put(records))
+        await asyncio.wait({put, self.consumer}, return_when=asyncio.FIRST_COMPLETED)
+        if self.consumer.done():
+            # the writer failed, surface its error instead of waiting forever
+            put.cancel()
+            self.consumer.result()
+
+    async def consume(self):
+        while (records := await self.queue.get()) is not None:
+            # pandas serialisation is CPU work, keep it off the event loop
+            await asyncio.to_thread(self.writer.write, records)
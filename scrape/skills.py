@@ -0,0 +1,185 @@
+"""
+Skills and technologies mentioned by every posting.
+
+A taxonomy (skills.json: category -> skill -> aliases) of languages, cloud services,
+degrees, ... is compiled into one Aho-Corasick automaton over words, so every
+alias of every skill is found in a single pass over the words of a posting, however
+large the taxonomy. Years of experience ("5+ years") are read with one regex.
+Postings are matched in batches across processes and the result is a sparse,
+long posting x skill table:
+
+    posting, skill, category, count
+
+    table = extract_skills(jobs, ["title", "description", "qualifications"])
+    table.groupby("skill")["posting"].nunique().nlargest(20)
+
+Only the aliases of a skill are matched (not its name), on whole words and
+case-insensitively, after the same tokenization as the postings ("C++", "C#",
+"node.js" and "bachelor's" are words, "ci/cd" is the phrase "ci cd").
+
+Usage: python scrape/skills.py [--date 2023-05-21] [--taxonomy ...] [company ...]
+writes the skills of every normalized job to data/skills-{date}.csv
+"""
+
+import argparse
+import functools
+import json
+import os
+import re
+from collections import Counter, deque
+from datetime import date
+
+import pandas as pd
+
+import normalize
+import text
+
+SKILLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skills.json")
+OUTPUT = "data/skills-{date}.csv"
+TEXT_COLUMNS = ["title", "description", "qualifications"]
+# words may hold + and # (c++, c#) and inner dots or apostrophes (node.js, ph.d)
+WORD = re.compile(r"\.?[a-z0-9](?:[a-z0-9+#]|[.'](?=[a-z0-9]))*")
+YEARS = re.compile(r"\b(\d{1,2})\s*\+?\s*(?:years?|yrs)\b")
+EXPERIENCE = "experience"
+
+
+def words(value: str):
+    """Words of a lowercase text"""
+    return WORD.findall(value)
+
+
+class Automaton:
+    """Aho-Corasick automaton over words, finds every phrase of a dictionary"""
+
+    def __init__(self, phrases: dict):
+        """`phrases` maps a tuple of words to the skills it stands for"""
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for phrase, skills in phrases.items():
+            state = 0
+            for word in phrase:
+                if word not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][word] = len(self.goto) - 1
+                state = self.goto[state][word]
+            self.out[state].extend((skill, len(phrase)) for skill in skills)
+        # failure links, breadth first: the longest proper suffix in the trie
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fail = self.fail[state]
+                while fail and word not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(word, 0)
+                self.out[child].extend(self.out[self.fail[child]])
+
+    def count(self, words):
+        """Counter of the mentions of every skill in a list of words
+
+        Overlapping matches of one skill ("google cloud" in "google cloud platform")
+        are a single mention.
+        """
+        goto, fail, out = self.goto, self.fail, self.out
+        found = Counter()
+        last = {}  # skill -> end of the last match counted or merged into it
+        state = 0
+        for end, word in enumerate(words):
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            for skill, length in out[state]:
+                if last.get(skill, -1) < end - length + 1:
+                    found[skill] += 1
+                last[skill] = end
+        return found
+
+
+def read_taxonomy(path: str = SKILLS):
+    """{skill: category} and {phrase (tuple of words): [skill, ...]} of a taxonomy"""
+    with open(path) as file:
+        taxonomy = json.load(file)
+    categories = {}
+    phrases = {}
+    for category, skills in taxonomy.items():
+        for skill, aliases in skills.items():
+            categories[skill] = category
+            for alias in aliases:
+                phrase = tuple(words(alias.lower()))
+                if phrase and skill not in phrases.setdefault(phrase, []):
+                    phrases[phrase].append(skill)
+    return categories, phrases
+
+
+@functools.lru_cache(maxsize=None)
+def automaton(path: str = SKILLS):
+    """Automaton of a taxonomy, compiled once per process"""
+    return Automaton(read_taxonomy(path)[1])
+
+
+def match_batch(texts, taxonomy: str = SKILLS):
+    """(document, skill, count) of every skill found in a batch of texts"""
+    matcher = automaton(taxonomy)
+    texts = pd.Series(texts, dtype="object").fillna("").astype(str)
+    texts = texts.str.replace(text.HTML_TAG, " ", regex=True).str.lower()
+    texts = texts.str.replace("\u2019", "'")
+    rows = []
+    for doc, value in enumerate(texts):
+        found = matcher.count(words(value))
+        for years in YEARS.findall(value):
+            found[f"{int(years)}+ years"] += 1
+        rows.extend((doc, skill, count) for skill, count in found.items())
+    return rows
+
+
+def extract_skills(
+    df, columns=TEXT_COLUMNS, taxonomy: str = SKILLS, processes=text.PROCESSES
+):
+    """Sparse posting x skill table of the text columns, postings by index label"""
+    texts = df[columns[0]].fillna("").astype(str)
+    for col in columns[1:]:
+        texts = texts + "\n" + df[col].fillna("").astype(str)
+    texts = texts.tolist()
+    starts = range(0, len(texts), text.BATCH_SIZE)
+    batches = [texts[start : start + text.BATCH_SIZE] for start in starts]
+    match = functools.partial(match_batch, taxonomy=taxonomy)
+    results = text.map_batches(match, batches, processes)
+
+    categories = read_taxonomy(taxonomy)[0]
+    rows = [
+        (start + doc, skill, count)
+        for start, batch_rows in zip(starts, results)
+        for doc, skill, count in batch_rows
+    ]
+    table = pd.DataFrame(rows, columns=["row", "skill", "count"])
+    table.insert(0, "posting", df.index[table.pop("row").to_numpy()])
+    category = table["skill"].map(categories).fillna(EXPERIENCE)
+    table.insert(2, "category", category.astype("category"))
+    table["skill"] = table["skill"].astype("category")
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("companies", nargs="*", metavar="company")
+    parser.add_argument("--date", default=str(date.today()))
+    parser.add_argument("--taxonomy", default=SKILLS)
+    args = parser.parse_args()
+    jobs = normalize.load_jobs(
+        columns=["id", "company", *TEXT_COLUMNS],
+        companies=args.companies or None,
+        dates=[args.date],
+    )
+    table = extract_skills(jobs, taxonomy=args.taxonomy)
+    postings = jobs.loc[table["posting"], ["company", "id"]].reset_index(drop=True)
+    table = pd.concat([postings, table.drop(columns="posting")], axis=1)
+    path = OUTPUT.format(date=args.date)
+    table.to_csv(path, index=False)
+    print(
+        f"{len(table)} skill mentions of {table['skill'].nunique()} skills in "
+        f"{len(jobs)} jobs, saved to {path}"
+    )
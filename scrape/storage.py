@@ -0,0 +1,341 @@
+"""
+Snapshot storage: CSV (default) or Parquet.
+
+Parquet snapshots use an explicit, compact schema: low-cardinality columns are stored
+as dictionary-encoded categoricals, date columns as real dates and everything else as
+strings (nested lists/dicts are JSON encoded). Readers can load only the columns they
+need:
+
+    df = read_snapshot("data/amazon-2023-05-21.parquet", columns=["city", "title"])
+
+The "blocks" format (data/amazon-2023-05-21.blocks.parquet) is Parquet where the
+long text columns (BLOCK_COLUMNS) are split into paragraph blocks. Every block is
+stored once, keyed by its hash, in blocks.sqlite next to the snapshots and shared
+by all of them, and a posting keeps the list of its block hashes. The boilerplate
+repeated across thousands of postings and every daily snapshot (EEO statements,
+benefits) is then stored once, however many days of snapshots are kept.
+`read_snapshot` puts the texts back together, readers see the same columns as in a
+Parquet snapshot.
+
+Parquet support needs pyarrow (`poetry install -E parquet`).
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zlib
+from contextlib import closing
+from datetime import date
+
+import pandas as pd
+
+FORMATS = ("csv", "parquet", "blocks")
+EXTENSIONS = {"csv": "csv", "parquet": "parquet", "blocks": "blocks.parquet"}
+SNAPSHOT = "data/{company}-{date}{suffix}.{fmt}"
+# low-cardinality columns of the different career sites
+CATEGORY_COLUMNS = {
+    "business_category",
+    "category",
+    "city",
+    "company_name",
+    "country_code",
+    "job_category",
+    "job_family",
+    "job_schedule_type",
+    "normalized_location",
+    "primary_search_label",
+    "source_system",
+    "state",
+    "subcategory",
+    "roleType",
+    "employmentType",
+    "educationLevel",
+    "jobType",
+    "travelPercentage",
+    "workSiteFlexibility",
+    "team",
+    "company",
+}
+DATE_COLUMNS = {"posted_date", "postingDate", "postDateInGMT", "posted", "unposted"}
+# long text columns stored as paragraph blocks in the "blocks" format
+BLOCK_COLUMNS = {
+    "description",
+    "basic_qualifications",
+    "preferred_qualifications",
+    "qualifications",
+    "responsibilities",
+    "jobSummary",
+    "minimumQualifications",
+    "preferredQualifications",
+    "Team_description",
+    "Responsibilites",
+    "Minimum_qualifications",
+    "Preferred_qualifications",
+}
+BLOCKS = "blocks.sqlite"
+# a block ends after a line or paragraph break once it is this long
+MIN_BLOCK = 64
+BLOCK_END = re.compile(r"(\n|<br/?>|</(?:p|li|ul)>)")
+BLOCKS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL -- zlib compressed text
+) WITHOUT ROWID;
+"""
+
+
+def snapshot_path(company: str, suffix: str = "", fmt: str = "csv"):
+    """Path of today's snapshot, e.g. data/microsoft-2023-05-21-run1.parquet"""
+    return SNAPSHOT.format(
+        company=company, date=date.today(), suffix=suffix, fmt=EXTENSIONS[fmt]
+    )
+
+
+def snapshot_format(path: str):
+    """Format of a snapshot from its file name"""
+    for fmt in sorted(FORMATS, key=lambda fmt: -len(EXTENSIONS[fmt])):
+        if path.endswith("." + EXTENSIONS[fmt]):
+            return fmt
+    return "csv"
+
+
+def split_blocks(value: str):
+    """Paragraphs of a text, at least MIN_BLOCK long but the last one
+
+    Joining the blocks gives back the text.
+    """
+    blocks = []
+    block = ""
+    # pieces alternate text and the break that ends it
+    pieces = BLOCK_END.split(value)
+    for start in range(0, len(pieces), 2):
+        block += "".join(pieces[start : start + 2])
+        if len(block) >= MIN_BLOCK:
+            blocks.append(block)
+            block = ""
+    if block or not blocks:
+        blocks.append(block)
+    return blocks
+
+
+def block_hash(block: str):
+    return hashlib.blake2b(block.encode(), digest_size=8).hexdigest()
+
+
+class BlockStore:
+    """Text blocks keyed by their hash, each stored once and compressed
+
+    Every call opens its own connection: `sink.Sink` writes its batches from
+    worker threads and SQLite connections are bound to the thread that made them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(sqlite3.connect(self.path)) as db:
+            db.executescript(BLOCKS_SCHEMA)
+
+    def put(self, values):
+        """List of block hashes of every text (missing texts stay None)"""
+        refs = {}
+        new = {}
+        for value in pd.unique(values):
+            if not isinstance(value, str):
+                continue
+            hashes = []
+            for block in split_blocks(value):
+                key = block_hash(block)
+                new[key] = block
+                hashes.append(key)
+            refs[value] = hashes
+        with closing(sqlite3.connect(self.path)) as db, db:
+            db.executemany(
+                "INSERT OR IGNORE INTO blocks VALUES (?, ?)",
+                ((key, zlib.compress(block.encode())) for key, block in new.items()),
+            )
+        return [refs.get(value) for value in values]
+
+    def get(self, refs):
+        """Texts of lists of block hashes (None stays None)"""
+        refs = [None if value is None else tuple(value) for value in refs]
+        unique = set(refs)
+        unique.discard(None)
+        keys = list({key for value in unique for key in value})
+        blocks = {}
+        with closing(sqlite3.connect(self.path)) as db:
+            # stay under SQLite's limit of variables per statement
+            for start in range(0, len(keys), 10000):
+                chunk = keys[start : start + 10000]
+                rows = db.execute(
+                    "SELECT hash, data FROM blocks "
+                    f"WHERE hash IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                blocks.update(
+                    (key, zlib.decompress(data).decode()) for key, data in rows
+                )
+        texts = {value: "".join(blocks[key] for key in value) for value in unique}
+        return [texts.get(value) for value in refs]
+
+
+def block_store(path: str):
+    """Block store shared by the snapshots of a directory"""
+    return BlockStore(os.path.join(os.path.dirname(path) or ".", BLOCKS))
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as error:
+        raise ImportError(
+            "Parquet output needs pyarrow, install it with `poetry install -E parquet`"
+        ) from error
+
+
+def _encode(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def apply_schema(df):
+    """Cast a batch of raw records to the snapshot dtypes"""
+    df = df.copy()
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            dates = pd.to_datetime(df[col], errors="coerce", utc=True, format="mixed")
+            df[col] = dates.dt.date
+        elif col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("string").astype("category")
+        else:
+            df[col] = df[col].map(_encode).astype("string")
+    return df
+
+
+def arrow_schema(df):
+    """Arrow schema of a batch that went through `apply_schema`"""
+    import pyarrow as pa
+
+    fields = []
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            fields.append(pa.field(col, pa.date32()))
+        elif col in CATEGORY_COLUMNS:
+            fields.append(pa.field(col, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+class ParquetWriter:
+    """Append record batches to a Parquet file, one row group per batch
+
+    The first batch decides the columns, a later batch bringing new ones rewrites
+    the row groups already written with them, like `sink.CsvWriter`. A
+    `.blocks.parquet` path stores the BLOCK_COLUMNS as references into the
+    directory's block store.
+    """
+
+    def __init__(self, path: str):
+        _require_pyarrow()
+        self.path = path
+        self.schema = None
+        self.writer = None
+        self.count = 0
+        self.blocks = None
+        if snapshot_format(path) == "blocks":
+            self.blocks = block_store(path)
+
+    def fields(self, df):
+        """Arrow fields of the columns of a batch"""
+        import pyarrow as pa
+
+        schema = arrow_schema(df)
+        if self.blocks is not None:
+            # block columns hold the list of hashes of their blocks
+            for col in BLOCK_COLUMNS.intersection(df.columns):
+                field = pa.field(col, pa.list_(pa.string()))
+                schema = schema.set(schema.get_field_index(col), field)
+        return list(schema)
+
+    def open(self, fields):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.schema = pa.schema(fields)
+        if self.blocks is not None:
+            columns = sorted(BLOCK_COLUMNS.intersection(self.schema.names))
+            self.schema = self.schema.with_metadata({"blocks": json.dumps(columns)})
+        self.writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write(self, records):
+        import pyarrow as pa
+
+        df = pd.DataFrame(records)
+        if df.empty:
+            return
+        if self.schema is None:
+            self.open(self.fields(df))
+        else:
+            extra = [col for col in df.columns if col not in self.schema.names]
+            if extra:
+                self.widen(self.fields(df[extra]))
+            df = df.reindex(columns=self.schema.names)
+        df = apply_schema(df)
+        if self.blocks is not None:
+            for col in BLOCK_COLUMNS.intersection(df.columns):
+                df[col] = self.blocks.put(df[col].astype(object))
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        self.writer.write_table(table)
+        self.count += len(df)
+
+    def widen(self, extra):
+        """Rewrite the row groups written so far with new, empty columns"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.writer.close()
+        old_path = self.path + ".old"
+        os.replace(self.path, old_path)
+        self.open(list(self.schema) + extra)
+        with pq.ParquetFile(old_path) as old:
+            for i in range(old.num_row_groups):
+                group = old.read_row_group(i)
+                nulls = [pa.nulls(len(group), field.type) for field in extra]
+                table = pa.Table.from_arrays(group.columns + nulls, schema=self.schema)
+                self.writer.write_table(table)
+        os.remove(old_path)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def read_snapshot(path: str, columns=None):
+    """Read a CSV, Parquet or blocks snapshot, optionally only some of its columns"""
+    if path.endswith(".parquet"):
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+
+        df = pd.read_parquet(path, columns=columns)
+        # date32 columns come back as python dates
+        for col in DATE_COLUMNS.intersection(df.columns):
+            df[col] = pd.to_datetime(df[col])
+        metadata = pq.read_schema(path).metadata or {}
+        if b"blocks" in metadata:
+            blocks = block_store(path)
+            for col in set(json.loads(metadata[b"blocks"])).intersection(df.columns):
+                df[col] = blocks.get(df[col])
+        return df
+    return pd.read_csv(path, usecols=columns, encoding="utf-8-sig")
+
+
+def csv_to_parquet(path: str, chunksize: int = 10000):
+    """Convert an existing CSV snapshot next to it, return the parquet path"""
+    parquet_path = os.path.splitext(path)[0] + ".parquet"
+    writer = ParquetWriter(parquet_path)
+    for chunk in pd.read_csv(path, chunksize=chunksize, encoding="utf-8-sig"):
+        writer.write(chunk)
+    writer.close()
+    return parquet_path
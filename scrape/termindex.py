@@ -0,0 +1,274 @@
+"""
+Term-frequency index of a snapshot.
+
+Every posting of a snapshot is tokenized once (see text.py) into per document
+sparse unigram and bigram counts of each text column, stored next to its facet
+columns as categorical codes. Any facet filter is then a row selection and a sum
+instead of a new pass over the raw text:
+
+    index = TermIndex.load("data/amazon-2023-05-21.parquet")
+    index.top_terms("basic_qualifications", bigram=True, city="Singapore")
+    index.top_terms("qualifications", company=["amazon", "google"])  # data/jobs
+
+The index is saved next to the snapshot (data/amazon-2023-05-21.terms.npz) and
+rebuilt when the snapshot (or any file of the normalized dataset) changes.
+
+Usage: python scrape/termindex.py data/amazon-2023-05-21.parquet [...]
+"""
+
+import argparse
+import hashlib
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+import normalize
+import storage
+import text
+
+VERSION = 1
+TEXT_COLUMNS = (
+    "title",
+    "description",
+    "basic_qualifications",
+    "preferred_qualifications",
+    "qualifications",
+    "responsibilities",
+    "jobSummary",
+    "minimumQualifications",
+    "preferredQualifications",
+)
+
+
+def index_path(path: str):
+    """data/amazon-2023-05-21.parquet -> data/amazon-2023-05-21.terms.npz"""
+    return os.path.splitext(path.rstrip("/"))[0] + ".terms.npz"
+
+
+def fingerprint(path: str):
+    """Hash of the size and mtime of a snapshot, or of every file of a dataset"""
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+        )
+    else:
+        files = [path]
+    digest = hashlib.sha256()
+    for file in files:
+        stat = os.stat(file)
+        digest.update(f"{file}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def read(path: str):
+    if os.path.isdir(path):
+        return normalize.load_jobs(root=path)
+    return storage.read_snapshot(path)
+
+
+def document_terms(texts, stop=frozenset()):
+    """Per document unigram and bigram counts of a batch, terms keyed by hash
+
+    Returns (doc, hash, count) of the unigrams, (doc, hash, hash, count) of the
+    bigrams and the words of the hashes.
+    """
+    codes, vocab = text.encode(texts, stop)
+    hashes = pd.util.hash_array(vocab)
+    size = len(vocab)
+    end = vocab == text.END
+    is_end = end[codes]
+    docs = np.cumsum(is_end)
+    words = pd.Series(vocab[~end], index=hashes[~end])
+
+    keys = docs[~is_end] * size + codes[~is_end]
+    keys, counts = np.unique(keys, return_counts=True)
+    unigrams = (keys // size, hashes[keys % size], counts)
+
+    first, second = codes[:-1], codes[1:]
+    within = ~(is_end[:-1] | is_end[1:])
+    keys = docs[:-1][within] * size * size + first[within] * size + second[within]
+    keys, counts = np.unique(keys, return_counts=True)
+    pairs = keys % (size * size)
+    bigrams = (
+        keys // (size * size),
+        hashes[pairs // size],
+        hashes[pairs % size],
+        counts,
+    )
+    return unigrams, bigrams, words
+
+
+def csr(docs, terms, counts, rows: int):
+    """Row pointers, term ids and counts of (doc, term, count) sorted by doc"""
+    indptr = np.zeros(rows + 1, dtype="int64")
+    np.cumsum(np.bincount(docs, minlength=rows), out=indptr[1:])
+    return indptr, terms.astype("int32"), counts.astype("int32")
+
+
+class TermIndex:
+    """Sparse per posting term counts of the text columns of a snapshot"""
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+        self.rows = int(arrays["rows"])
+        self.words = arrays["words"]
+        self.bigrams = arrays["bigrams"]
+        self.columns = [str(col) for col in arrays["columns"]]
+        self.facets = [str(col) for col in arrays["facets"]]
+        self._docs = {}
+
+    @classmethod
+    def build(cls, df, columns=None, facets=None, processes=text.PROCESSES):
+        """Index the text `columns` of a DataFrame, with `facets` for filtering"""
+        if columns is None:
+            columns = [col for col in TEXT_COLUMNS if col in df.columns]
+        if facets is None:
+            facets = sorted(storage.CATEGORY_COLUMNS.intersection(df.columns))
+        count = partial(document_terms, stop=text.stop_words())
+        jobs = [
+            (col, start, df[col].iloc[start : start + text.BATCH_SIZE].tolist())
+            for col in columns
+            for start in range(0, len(df), text.BATCH_SIZE)
+        ]
+        results = text.map_batches(count, [batch for _, _, batch in jobs], processes)
+
+        # one vocabulary for every column: unigram ids, bigrams are pairs of ids
+        words = pd.concat([batch_words for _, _, batch_words in results])
+        words = words[~words.index.duplicated()]
+        unigrams = {col: [] for col in columns}
+        bigrams = {col: [] for col in columns}
+        for (col, start, _), (batch_unigrams, batch_bigrams, _) in zip(jobs, results):
+            docs, hashes, counts = batch_unigrams
+            ids = words.index.get_indexer(hashes)
+            unigrams[col].append((docs + start, ids, counts))
+            docs, first, second, counts = batch_bigrams
+            keys = words.index.get_indexer(first) * len(words)
+            keys += words.index.get_indexer(second)
+            bigrams[col].append((docs + start, keys, counts))
+        # bigram ids, in the order of first appearance like the words
+        keys = np.concatenate([part[1] for parts in bigrams.values() for part in parts])
+        bigram_ids, bigram_keys = pd.factorize(keys)
+        offset = 0
+        for parts in bigrams.values():
+            for i, (docs, keys, counts) in enumerate(parts):
+                parts[i] = (docs, bigram_ids[offset : offset + len(keys)], counts)
+                offset += len(keys)
+
+        arrays = {
+            "version": VERSION,
+            "rows": len(df),
+            "words": words.to_numpy().astype(str),
+            "bigrams": np.stack(
+                [bigram_keys // len(words), bigram_keys % len(words)]
+            ).astype("int32"),
+            "columns": np.array(columns, dtype=str),
+            "facets": np.array(facets, dtype=str),
+        }
+        for col in columns:
+            for name, parts in (("unigram", unigrams[col]), ("bigram", bigrams[col])):
+                docs, terms, counts = (np.concatenate(part) for part in zip(*parts))
+                indptr, indices, data = csr(docs, terms, counts, len(df))
+                arrays[f"{col}/{name}/indptr"] = indptr
+                arrays[f"{col}/{name}/indices"] = indices
+                arrays[f"{col}/{name}/data"] = data
+        for facet in facets:
+            codes, categories = pd.factorize(df[facet].astype("string"))
+            arrays[f"facet/{facet}/codes"] = codes.astype("int32")
+            arrays[f"facet/{facet}/categories"] = np.asarray(categories, dtype=str)
+        return cls(arrays)
+
+    @classmethod
+    def load(cls, path: str, columns=None, facets=None, rebuild: bool = False):
+        """Index of a snapshot (or of the normalized dataset), built when missing
+
+        The saved index is reused while the snapshot is unchanged and covers the
+        requested columns and facets.
+        """
+        saved = index_path(path)
+        source = fingerprint(path)
+        if not rebuild and os.path.exists(saved):
+            with np.load(saved) as npz:
+                arrays = dict(npz)
+            index = cls(arrays)
+            if (
+                int(arrays["version"]) == VERSION
+                and str(arrays["source"]) == source
+                and set(columns or ()).issubset(index.columns)
+                and set(facets or ()).issubset(index.facets)
+            ):
+                return index
+        print(f"Indexing the terms of {path}")
+        index = cls.build(read(path), columns, facets)
+        index.save(saved, source)
+        return index
+
+    def save(self, path: str, source: str = ""):
+        self.arrays["source"] = source
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **self.arrays)
+        os.replace(tmp, path)
+
+    def select(self, mask=None, **facets):
+        """Boolean row mask of the postings matching every facet value (or list)"""
+        rows = np.ones(self.rows, dtype=bool) if mask is None else np.array(mask, bool)
+        for facet, values in facets.items():
+            if facet not in self.facets:
+                raise KeyError(f"{facet} is not a facet of the index: {self.facets}")
+            if isinstance(values, str) or not hasattr(values, "__iter__"):
+                values = [values]
+            categories = self.arrays[f"facet/{facet}/categories"]
+            wanted = np.flatnonzero(np.isin(categories, [str(v) for v in values]))
+            rows &= np.isin(self.arrays[f"facet/{facet}/codes"], wanted)
+        return rows
+
+    def counts(self, column: str, bigram: bool = False, mask=None, **facets):
+        """Term counts of a column over the selected postings, indexed by term id"""
+        if column not in self.columns:
+            raise KeyError(f"{column} is not indexed: {self.columns}")
+        name = f"{column}/{'bigram' if bigram else 'unigram'}"
+        indptr = self.arrays[f"{name}/indptr"]
+        indices = self.arrays[f"{name}/indices"]
+        data = self.arrays[f"{name}/data"]
+        terms = self.bigrams.shape[1] if bigram else len(self.words)
+        if mask is None and not facets:
+            return np.bincount(indices, weights=data, minlength=terms)
+        if name not in self._docs:
+            self._docs[name] = np.repeat(np.arange(self.rows), np.diff(indptr))
+        selected = self.select(mask, **facets)[self._docs[name]]
+        return np.bincount(indices[selected], weights=data[selected], minlength=terms)
+
+    def term(self, term_id: int, bigram: bool = False):
+        if not bigram:
+            return str(self.words[term_id])
+        first, second = self.bigrams[:, term_id]
+        return str(self.words[first]), str(self.words[second])
+
+    def top_terms(
+        self, column: str, n: int = 100, bigram: bool = False, mask=None, **facets
+    ):
+        """Most common terms of a column over the selected postings, as (term, count)"""
+        counts = self.counts(column, bigram, mask, **facets)
+        top = np.arange(len(counts))
+        if n < len(counts):
+            top = np.argpartition(-counts, n)[:n]
+        # most common first, ties in order of first appearance
+        top = top[np.lexsort((top, -counts[top]))][:n]
+        return [
+            (self.term(term_id, bigram), int(counts[term_id]))
+            for term_id in top
+            if counts[term_id]
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="snapshots or the data/jobs dataset")
+    parser.add_argument("--rebuild", action="store_true")
+    args = parser.parse_args()
+    for path in args.paths:
+        index = TermIndex.load(path, rebuild=args.rebuild)
+        print(f"{index_path(path)}: {index.rows} postings, {len(index.words)} words")
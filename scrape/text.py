@@ -0,0 +1,171 @@
+"""
+Term frequencies of the job texts.
+
+Replaces the notebook's per-row `text_preprocess` / `nltk_preprocess` / `get_freq`:
+HTML stripping and normalisation run as pandas string operations over whole
+columns, stopwords are loaded once, and unigrams or bigrams are counted with numpy
+over the hashed tokens of batches of documents spread across processes:
+
+    top_terms(df_amzn["basic_qualifications"], bigram=True)
+    term_frequencies(jobs, ["title", "description", "qualifications"], by="company")
+
+Tokens are the whitespace separated words of the cleaned text (letters, digits and
+`+`, lowercased), so "C++" stays one token.
+"""
+
+import functools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+HTML_TAG = r"<.*?>"
+NON_WORD = r"[^a-z0-9\s+]"
+# cannot appear in a cleaned text, marks the end of a document in a batch
+END = "|"
+BATCH_SIZE = 2000  # documents counted per task
+PROCESSES = os.cpu_count()
+
+
+@functools.lru_cache(maxsize=None)
+def stop_words(language: str = "english"):
+    """NLTK stopwords, read once per process"""
+    from nltk.corpus import stopwords
+
+    try:
+        return frozenset(stopwords.words(language))
+    except LookupError as error:
+        raise LookupError(
+            "The NLTK stopwords are missing, run `python -m nltk.downloader stopwords`"
+        ) from error
+
+
+def clean(series):
+    """Lowercase text of a column without HTML tags and punctuation"""
+    text = series.astype("string").fillna("")
+    text = text.str.replace(HTML_TAG, " ", regex=True)
+    text = text.str.lower().str.replace(NON_WORD, "", regex=True)
+    return text
+
+
+def encode(texts, stop=frozenset()):
+    """Token codes of a batch of raw texts, without stopwords, and the vocabulary
+
+    Documents are separated by the code of END.
+    """
+    text = f" {END} ".join(clean(pd.Series(texts, dtype="object")))
+    codes, vocab = pd.factorize(pd.Series(text.split(), dtype="object"))
+    vocab = np.asarray(vocab, dtype="object")
+    stopped = np.fromiter((word in stop for word in vocab), bool, len(vocab))
+    return codes[~stopped[codes]], vocab
+
+
+def count_batch(texts, bigram: bool = False, stop=frozenset()):
+    """Unigram (or bigram) counts of a batch of raw texts
+
+    Terms are keyed by the 64-bit hash of their words, so the counts of batches
+    tokenized in different processes add up without sharing a vocabulary. Returns
+    the counts and the words of the hashes.
+    """
+    codes, vocab = encode(texts, stop)
+    hashes = pd.util.hash_array(vocab)
+    end = vocab == END
+    words = pd.Series(vocab[~end], index=hashes[~end])
+    if not bigram:
+        codes = codes[~end[codes]]
+        counts = np.bincount(codes, minlength=len(vocab))
+        seen = counts.nonzero()[0]
+        return pd.Series(counts[seen], index=hashes[seen]), words
+    first, second = codes[:-1], codes[1:]
+    # pairs spanning two documents
+    within = ~(end[first] | end[second])
+    pairs = first[within].astype("int64") * len(vocab) + second[within]
+    pairs, counts = np.unique(pairs, return_counts=True)
+    index = pd.MultiIndex.from_arrays(
+        [hashes[pairs // len(vocab)], hashes[pairs % len(vocab)]]
+    )
+    return pd.Series(counts, index=index), words
+
+
+def batches(series, batch_size: int = BATCH_SIZE):
+    texts = series.dropna().tolist()
+    return [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+
+
+def map_batches(func, batches, processes: int = PROCESSES):
+    """`func` of every batch in order, spread across processes when there are several"""
+    if len(batches) < 2 or processes == 1:
+        return list(map(func, batches))
+    with ProcessPoolExecutor(min(processes, len(batches))) as pool:
+        return list(pool.map(func, batches))
+
+
+def count_terms(tasks, bigram: bool = False, processes: int = PROCESSES):
+    """Counts of every {key: [batch, ...]}, batches counted in parallel when worth it
+
+    Returns {key: counts by term hash} and the words of the hashes.
+    """
+    count = functools.partial(count_batch, bigram=bigram, stop=stop_words())
+    jobs = [(key, batch) for key, key_batches in tasks.items() for batch in key_batches]
+    results = map_batches(count, [batch for _, batch in jobs], processes)
+    return _merge(tasks, jobs, results)
+
+
+def _merge(tasks, jobs, results):
+    parts = {key: [] for key in tasks}
+    words = []
+    for (key, _), (counts, batch_words) in zip(jobs, results):
+        parts[key].append(counts)
+        words.append(batch_words)
+    totals = {}
+    for key, counts in parts.items():
+        if not counts:
+            totals[key] = pd.Series(dtype="int64")
+        elif len(counts) == 1:
+            totals[key] = counts[0]
+        else:
+            counts = pd.concat(counts)
+            totals[key] = counts.groupby(level=list(range(counts.index.nlevels))).sum()
+    words = pd.concat(words) if words else pd.Series(dtype="object")
+    return totals, words[~words.index.duplicated()]
+
+
+def most_common(counts, words, n: int = 100):
+    """The `n` most common terms, as (term, count), bigrams are (word, word) tuples"""
+    top = counts.sort_values(ascending=False, kind="stable").head(n)
+    if isinstance(top.index, pd.MultiIndex):
+        terms = zip(
+            words.loc[top.index.get_level_values(0)],
+            words.loc[top.index.get_level_values(1)],
+        )
+    else:
+        terms = words.loc[top.index]
+    return [(term, int(count)) for term, count in zip(terms, top)]
+
+
+def top_terms(series, n: int = 100, bigram: bool = False, processes=PROCESSES):
+    """Most common terms of a text column, like `nltk.FreqDist(...).most_common(n)`"""
+    totals, words = count_terms({None: batches(series)}, bigram, processes)
+    return most_common(totals[None], words, n)
+
+
+def term_frequencies(
+    df, columns, by: str = None, n: int = 100, bigram: bool = False, processes=PROCESSES
+):
+    """Top `n` terms of every column (and group), as one long DataFrame
+
+    Every column of every group is counted in the same process pool.
+    """
+    groups = [(None, df)] if by is None else df.groupby(by, observed=True)
+    tasks = {
+        (group, col): batches(frame[col]) for group, frame in groups for col in columns
+    }
+    rows = []
+    totals, words = count_terms(tasks, bigram, processes)
+    for (group, col), counts in totals.items():
+        for term, count in most_common(counts, words, n):
+            term = " ".join(term) if bigram else term
+            rows.append((group, col, term, count))
+    result = pd.DataFrame(rows, columns=[by or "group", "column", "term", "count"])
+    return result if by is not None else result.drop(columns="group")